@@ -0,0 +1,645 @@
+import collections
+import concurrent.futures
+import json
+import os
+import stat
+import struct
+import time
+import zipfile
+import zlib
+
+import config_store
+import copy_engine
+
+# 并行压缩时每块的大小，大文件被切成多块分别压缩后按顺序拼接
+_BLOCK_SIZE = 1024 * 1024
+# deflate的窗口大小，每块以前一块末尾的这么多字节作为预设字典，压缩率接近整体压缩
+_WINDOW_SIZE = 32 * 1024
+# 判断是否值得压缩时试压缩的样本大小，以及压缩后至少要达到的比例
+_SAMPLE_SIZE = 64 * 1024
+_SAMPLE_RATIO = 0.95
+
+# 超过该值的大小和偏移需要使用zip64记录（与zipfile一致）
+_ZIP64_LIMIT = (1 << 31) - 1
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+_ZIP64_END_RECORD = struct.Struct('<IQHHIIQQQQ')
+_ZIP64_LOCATOR = struct.Struct('<IIQI')
+_ZIP64_LOCAL_EXTRA = struct.Struct('<HHQQ')
+
+_LOCAL_SIGNATURE = 0x04034b50
+_CENTRAL_SIGNATURE = 0x02014b50
+_END_SIGNATURE = 0x06054b50
+_ZIP64_END_SIGNATURE = 0x06064b50
+_ZIP64_LOCATOR_SIGNATURE = 0x07064b50
+
+# 文件名为UTF-8编码的标志位
+_UTF8_FLAG = 0x800
+
+
+def _dos_date_time(mtime_ns):
+    """ZIP只能记录1980年到2107年之间的本地时间，精度为2秒，超出范围的时间取最近的边界"""
+    if mtime_ns is None:
+        mtime_ns = time.time_ns()
+    try:
+        local = time.localtime(mtime_ns / 1e9)[:6]
+    except (OverflowError, OSError, ValueError):
+        # 超出平台time_t范围的时间
+        local = (2107, 12, 31, 23, 59, 58) if mtime_ns > 0 else (1980, 1, 1, 0, 0, 0)
+    year, month, day, hour, minute, second = min(max(local, (1980, 1, 1, 0, 0, 0)), (2107, 12, 31, 23, 59, 58))
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+
+def _deflate_block(data, zdict, final, level):
+    """
+    将一块数据压缩为原始deflate流的一段
+    非最后一块以Z_SYNC_FLUSH结束（对齐到字节且不标记结束），各段按顺序拼接即为一个完整的deflate流
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def is_compressible(sample):
+    """试压缩数据开头的样本，压缩率很低（熵接近8位/字节）的内容不值得压缩"""
+    sample = sample[:_SAMPLE_SIZE]
+    return len(zlib.compress(sample, 1)) < len(sample) * _SAMPLE_RATIO
+
+
+class _Entry:
+    """写入中的归档项，写完数据后回填头部"""
+
+    def __init__(self, name, method, mtime_ns, external_attr, zip64):
+        self.name = name.encode('utf-8')
+        self.flags = 0 if name.isascii() else _UTF8_FLAG
+        self.method = method
+        self.time, self.date = _dos_date_time(mtime_ns)
+        self.external_attr = external_attr
+        self.zip64 = zip64
+        self.crc = 0
+        self.size = 0
+        self.compressed_size = 0
+        self.offset = 0
+
+
+class ParallelZipWriter:
+    """
+    多线程压缩的ZIP写入器
+    数据在调用线程中按顺序读取并计算CRC，压缩在线程池中并行进行，结果按原顺序写出；
+    同时在途的块数有上限，内存占用与文件大小无关。
+    每个文件根据调用方的判断和试压缩样本决定压缩（deflate）还是直接存储，超过2GB的文件和偏移使用zip64
+    """
+
+    def __init__(self, path, workers=copy_engine.DEFAULT_WORKERS, level=6):
+        """
+        :param path: ZIP文件路径
+        :param workers: 压缩线程数
+        :param level: deflate压缩级别
+        """
+        self.level = level
+        # 各压缩方式的文件数
+        self.stats = collections.Counter()
+        self._file = open(path, 'wb')
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        # 按写出顺序排列的待处理项：('start', 项) / ('data', 项, Future或bytes) / ('end', 项)
+        self._pending = collections.deque()
+        self._max_pending = workers * 4
+        self._entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_dir(self, name, mtime_ns=None):
+        """写入目录项"""
+        entry = _Entry(name.rstrip('/') + '/', zipfile.ZIP_STORED, mtime_ns, 0o40755 << 16 | 0x10, False)
+        self._push(('start', entry))
+        self._push(('end', entry))
+
+    def add_bytes(self, name, data, mtime_ns=None):
+        """写入内存中的数据"""
+        self.add_stream(name, _BytesReader(data), len(data), mtime_ns)
+
+    def add_stream(self, name, f, size, mtime_ns=None, mode=0o644, compress=True):
+        """
+        从文件对象顺序读取并写入一个文件
+        :param name: 归档内路径
+        :param f: 二进制文件对象
+        :param size: 预计大小，用于决定是否使用zip64
+        :param mtime_ns: 修改时间(纳秒)
+        :param mode: 权限
+        :param compress: 是否尝试压缩，为False时直接存储（例如已知已压缩的格式）
+        """
+        block = f.read(_BLOCK_SIZE)
+        compress = compress and bool(block) and is_compressible(block)
+        method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        external_attr = (stat.S_IFREG | stat.S_IMODE(mode)) << 16
+        entry = _Entry(name, method, mtime_ns, external_attr, size * 1.05 > _ZIP64_LIMIT)
+        self.stats['deflated' if compress else 'stored'] += 1
+        self._push(('start', entry))
+
+        zdict = None
+        while block:
+            next_block = f.read(_BLOCK_SIZE)
+            entry.crc = zlib.crc32(block, entry.crc)
+            entry.size += len(block)
+            if compress:
+                data = self._executor.submit(_deflate_block, block, zdict, not next_block, self.level)
+                zdict = block[-_WINDOW_SIZE:]
+            else:
+                data = block
+            self._push(('data', entry, data))
+            block = next_block
+        self._push(('end', entry))
+
+    def _push(self, item):
+        self._pending.append(item)
+        while len(self._pending) > self._max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        item = self._pending.popleft()
+        entry = item[1]
+        if item[0] == 'start':
+            entry.offset = self._file.tell()
+            self._write_local_header(entry)
+        elif item[0] == 'data':
+            data = item[2]
+            if isinstance(data, concurrent.futures.Future):
+                data = data.result()
+            self._file.write(data)
+            entry.compressed_size += len(data)
+        else:
+            if not entry.zip64 and max(entry.size, entry.compressed_size) > _ZIP64_LIMIT:
+                raise ValueError(f'文件大小超出预计，无法写入: {entry.name.decode("utf-8")}')
+            # 回填CRC和大小
+            end = self._file.tell()
+            self._file.seek(entry.offset)
+            self._write_local_header(entry)
+            self._file.seek(end)
+            self._entries.append(entry)
+
+    def _write_local_header(self, entry):
+        if entry.zip64:
+            extra = _ZIP64_LOCAL_EXTRA.pack(1, 16, entry.size, entry.compressed_size)
+            sizes = (0xFFFFFFFF, 0xFFFFFFFF)
+        else:
+            extra = b''
+            sizes = (entry.compressed_size, entry.size)
+        self._file.write(_LOCAL_HEADER.pack(_LOCAL_SIGNATURE, 45 if entry.zip64 else 20, entry.flags, entry.method,
+                                            entry.time, entry.date, entry.crc, *sizes, len(entry.name), len(extra)))
+        self._file.write(entry.name)
+        self._file.write(extra)
+
+    def close(self):
+        """写完全部数据和中央目录，失败时放弃写入并关闭文件后再抛出"""
+        try:
+            self._finish()
+        except BaseException:
+            self.abort()
+            raise
+
+    def _finish(self):
+        while self._pending:
+            self._write_next()
+        self._executor.shutdown()
+
+        central_offset = self._file.tell()
+        for entry in self._entries:
+            fields = []
+            sizes = [entry.compressed_size, entry.size]
+            offset = entry.offset
+            if entry.zip64:
+                fields += [entry.size, entry.compressed_size]
+                sizes = [0xFFFFFFFF, 0xFFFFFFFF]
+            if offset > _ZIP64_LIMIT:
+                fields.append(offset)
+                offset = 0xFFFFFFFF
+            extra = struct.pack(f'<HH{len(fields)}Q', 1, len(fields) * 8, *fields) if fields else b''
+            version = 45 if fields else 20
+            self._file.write(_CENTRAL_HEADER.pack(_CENTRAL_SIGNATURE, 3 << 8 | version, version, entry.flags,
+                                                  entry.method, entry.time, entry.date, entry.crc, *sizes,
+                                                  len(entry.name), len(extra), 0, 0, 0, entry.external_attr, offset))
+            self._file.write(entry.name)
+            self._file.write(extra)
+        central_size = self._file.tell() - central_offset
+
+        count = len(self._entries)
+        if count >= 0xFFFF or central_offset > _ZIP64_LIMIT or central_size > _ZIP64_LIMIT:
+            zip64_offset = self._file.tell()
+            self._file.write(_ZIP64_END_RECORD.pack(_ZIP64_END_SIGNATURE, _ZIP64_END_RECORD.size - 12, 3 << 8 | 45,
+                                                    45, 0, 0, count, count, central_size, central_offset))
+            self._file.write(_ZIP64_LOCATOR.pack(_ZIP64_LOCATOR_SIGNATURE, 0, zip64_offset, 1))
+            self._file.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+        else:
+            self._file.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, count, count, central_size, central_offset, 0))
+        self._file.close()
+
+    def abort(self):
+        """放弃写入，未完成的压缩任务被取消"""
+        for item in self._pending:
+            if item[0] == 'data' and isinstance(item[2], concurrent.futures.Future):
+                item[2].cancel()
+        self._pending.clear()
+        self._executor.shutdown()
+        self._file.close()
+
+
+class _BytesReader:
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._position = 0
+
+    def read(self, size):
+        data = bytes(self._view[self._position:self._position + size])
+        self._position += len(data)
+        return data
+
+
+def export_zip(store, manifest, path, extra_files=None, resolve=None, workers=copy_engine.DEFAULT_WORKERS,
+               level=6, progress=None):
+    """
+    将清单中的文件直接从仓库流式写入ZIP，不经过临时目录，多线程压缩，已压缩的格式直接存储
+    先写入同目录下的.partial文件，完成后再改名，中断时不会留下不完整的归档
+    :param store: 对象仓库
+    :param manifest: 清单
+    :param path: ZIP文件路径
+    :param extra_files: 额外写入归档的{归档内路径: bytes}，例如configs.json
+    :param resolve: 将相对路径映射为归档内路径的函数，返回None表示跳过该项，默认与相对路径相同
+    :param workers: 压缩线程数
+    :param level: deflate压缩级别
+    :param progress: 进度（可选），每写入一个文件前进一次，见task_manage.Progress
+    :return: 各压缩方式的文件数
+    """
+    resolve = resolve or (lambda rel: rel)
+    tmp_path = f'{path}.partial'
+    try:
+        with ParallelZipWriter(tmp_path, workers, level) as writer:
+            for name, data in (extra_files or {}).items():
+                writer.add_bytes(name, data)
+            for rel in manifest.dirs:
+                arcname = resolve(rel)
+                if arcname:
+                    writer.add_dir(arcname)
+            for rel, entry in manifest.files.items():
+                arcname = resolve(rel)
+                if not arcname:
+                    continue
+                compress = os.path.splitext(arcname)[1].lower() not in config_store.INCOMPRESSIBLE_EXTENSIONS
+                if progress:
+                    progress.check_cancelled()
+                with store.open(entry['hash']) as f:
+                    writer.add_stream(arcname, f, entry['size'], entry['mtime'], entry.get('mode') or 0o644,
+                                      compress)
+                if progress:
+                    progress.advance(1, entry['size'])
+        os.replace(tmp_path, path)
+        return dict(writer.stats)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# 归档中保存配置信息的文件
+CONFIG_INFO_NAME = 'configs.json'
+# 归档中属于配置内容的顶层目录
+_CONTENT_ROOTS = ('resources', 'config')
+
+
+def read_config_info(path):
+    """
+    只从归档的中央目录定位并读取configs.json，不解压其他内容
+    :param path: ZIP文件路径
+    :return: 配置信息 {'name', 'resources_path', 'platform', ...}
+    :raise ValueError: 归档中没有有效的配置信息
+    """
+    with zipfile.ZipFile(path) as zf:
+        try:
+            data = zf.read(CONFIG_INFO_NAME)
+        except KeyError:
+            raise ValueError(f'归档中缺少{CONFIG_INFO_NAME}: {path}') from None
+    info = json.loads(data.decode('utf-8'))
+    missing = [key for key in ('name', 'resources_path', 'platform') if not info.get(key)]
+    if missing:
+        raise ValueError(f'{CONFIG_INFO_NAME}中缺少{", ".join(missing)}: {path}')
+    return info
+
+
+def _member_rel(name):
+    """
+    将归档内路径转换为清单中的相对路径，不属于配置内容的项返回None
+    :raise ValueError: 路径试图指向归档之外
+    """
+    rel = name.replace('\\', '/').rstrip('/')
+    parts = rel.split('/')
+    # 任一层中的盘符或备用数据流（:）、空路径段和./..都可能让拼接出的路径落到目标目录之外
+    if any(not part or part in ('.', '..') or ':' in part for part in parts):
+        raise ValueError(f'归档中包含不安全的路径: {name}')
+    return rel if parts[0] in _CONTENT_ROOTS else None
+
+
+def _member_mtime_ns(info):
+    return int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+
+
+def import_zip(store, path, workers=copy_engine.DEFAULT_WORKERS, progress=None, link=True):
+    """
+    将归档中的配置内容直接流式解压进仓库并生成清单，不经过临时目录；各文件并行解压
+    :param store: 对象仓库
+    :param path: ZIP文件路径
+    :param workers: 并行线程数
+    :param progress: 进度（可选），每存入一个文件前进一次
+    :param link: 是否优先以硬链接将解压出的副本存入仓库，见ObjectStore.add_stream
+    :return: 清单
+    :raise ValueError: 归档中包含不安全的路径
+    :raise shutil.Error: 部分文件存入失败时抛出，包含全部出错的文件
+    """
+    with zipfile.ZipFile(path) as zf:
+        members = []
+        dirs = set(_CONTENT_ROOTS)
+        for info in zf.infolist():
+            rel = _member_rel(info.filename)
+            if rel is None:
+                continue
+            parts = rel.split('/')
+            dirs.update('/'.join(parts[:index]) for index in range(1, len(parts)))
+            if info.is_dir():
+                dirs.add(rel)
+            else:
+                members.append((rel, info))
+        if progress:
+            progress.set_total(len(members), sum(info.file_size for _, info in members))
+
+        def import_member(item):
+            rel, info = item
+            # 同一个ZipFile可以被多个线程同时读取，读取底层文件时加锁，解压在各线程中并行
+            with zf.open(info) as f:
+                digest, size = store.add_stream(f, rel, link)
+            if progress:
+                progress.advance(1, size)
+            mode = stat.S_IMODE(info.external_attr >> 16)
+            return {'hash': digest, 'size': size, 'mtime': _member_mtime_ns(info), 'ino': 0, 'mode': mode}
+
+        entries = copy_engine.run_parallel(import_member, members, workers, progress)
+
+    manifest = config_store.Manifest(dirs=sorted(dirs))
+    for (rel, _), entry in zip(members, entries):
+        manifest.files[rel] = entry
+    return manifest
+
+
+# 多配置归档的索引文件，以及其中内容和清单的存放位置
+BUNDLE_INFO_NAME = 'bundle.json'
+_BUNDLE_VERSION = 1
+_BUNDLE_OBJECTS = 'objects'
+_BUNDLE_MANIFESTS = 'manifests'
+
+
+def _manifest_to_json(manifest, resolve):
+    """清单中未被resolve排除的部分，用于写入多配置归档"""
+    files = {}
+    for rel, entry in manifest.files.items():
+        if resolve(rel):
+            files[rel] = {'hash': entry['hash'], 'size': entry['size'], 'mtime': entry['mtime'],
+                          'mode': entry.get('mode') or 0}
+    return {'files': files, 'dirs': [rel for rel in manifest.dirs if resolve(rel)]}
+
+
+def export_bundle(store, configs, path, workers=copy_engine.DEFAULT_WORKERS, level=6, progress=None):
+    """
+    将多个配置写入同一个归档，各配置之间相同的内容只保存一份
+    归档结构：bundle.json（各配置的信息和清单位置）、manifests/<序号>.json（清单）、objects/<内容哈希>（内容）
+    :param store: 对象仓库
+    :param configs: [(配置信息, 清单, resolve)]，配置信息即configs.json的内容，resolve返回None表示跳过该项
+    :param path: ZIP文件路径
+    :param workers: 压缩线程数
+    :param level: deflate压缩级别
+    :param progress: 进度（可选），每写入一个内容前进一次
+    :return: 各压缩方式的文件数
+    """
+    index = []
+    manifests = []
+    # 内容哈希 -> (大小, 用于判断文件类型的相对路径)
+    objects = {}
+    for number, (info, manifest, resolve) in enumerate(configs):
+        data = _manifest_to_json(manifest, resolve or (lambda rel: rel))
+        for rel, entry in data['files'].items():
+            objects.setdefault(entry['hash'], (entry['size'], rel))
+        manifest_name = f'{_BUNDLE_MANIFESTS}/{number}.json'
+        manifests.append((manifest_name, json.dumps(data, ensure_ascii=False).encode('utf-8')))
+        index.append(dict(info, manifest=manifest_name))
+
+    tmp_path = f'{path}.partial'
+    try:
+        with ParallelZipWriter(tmp_path, workers, level) as writer:
+            writer.add_bytes(BUNDLE_INFO_NAME, json.dumps({'version': _BUNDLE_VERSION, 'configs': index},
+                                                          ensure_ascii=False, indent=4).encode('utf-8'))
+            for name, data in manifests:
+                writer.add_bytes(name, data)
+            for digest, (size, rel) in objects.items():
+                compress = os.path.splitext(rel)[1].lower() not in config_store.INCOMPRESSIBLE_EXTENSIONS
+                if progress:
+                    progress.check_cancelled()
+                with store.open(digest) as f:
+                    writer.add_stream(f'{_BUNDLE_OBJECTS}/{digest}', f, size, compress=compress)
+                if progress:
+                    progress.advance(1, size)
+        os.replace(tmp_path, path)
+        return dict(writer.stats)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_bundle_info(path):
+    """
+    读取多配置归档中的配置信息，不解压其他内容
+    :param path: ZIP文件路径
+    :return: [配置信息]，不是多配置归档时返回None
+    :raise ValueError: 归档的版本不受支持
+    """
+    with zipfile.ZipFile(path) as zf:
+        try:
+            data = json.loads(zf.read(BUNDLE_INFO_NAME).decode('utf-8'))
+        except KeyError:
+            return None
+    if data.get('version') != _BUNDLE_VERSION:
+        raise ValueError(f'不支持的归档版本: {data.get("version")}')
+    return data['configs']
+
+
+def import_bundle(store, path, names, workers=copy_engine.DEFAULT_WORKERS, progress=None, link=True):
+    """
+    从多配置归档中导入选中的配置，仓库中已有的内容不会重复解压，各内容并行解压
+    :param store: 对象仓库
+    :param path: ZIP文件路径
+    :param names: 要导入的配置名称
+    :param workers: 并行线程数
+    :param progress: 进度（可选），每处理一个内容前进一次
+    :param link: 是否优先以硬链接将解压出的副本存入仓库，见ObjectStore.add_stream
+    :return: {配置名: (配置信息, 清单)}
+    :raise ValueError: 归档中的内容缺失或与记录的哈希不一致
+    :raise shutil.Error: 部分内容存入失败时抛出
+    """
+    names = set(names)
+    result = {}
+    with zipfile.ZipFile(path) as zf:
+        configs = json.loads(zf.read(BUNDLE_INFO_NAME).decode('utf-8'))['configs']
+        # 内容哈希 -> 用于判断文件类型的相对路径，以及内容的大小
+        needed = {}
+        sizes = {}
+        for info in configs:
+            if info['name'] not in names:
+                continue
+            data = json.loads(zf.read(info['manifest']).decode('utf-8'))
+            for rel in list(data['files']) + data['dirs']:
+                _member_rel(rel)
+            manifest = config_store.Manifest(data['files'], data['dirs'])
+            for rel, entry in manifest.files.items():
+                needed.setdefault(entry['hash'], rel)
+                sizes[entry['hash']] = entry['size']
+            info = {key: value for key, value in info.items() if key != 'manifest'}
+            result[info['name']] = (info, manifest)
+        if progress:
+            progress.set_total(len(needed), sum(sizes.values()))
+
+        def import_object(item):
+            digest, rel = item
+            store.touch(digest)
+            if not store.has(digest):
+                try:
+                    member = zf.getinfo(f'{_BUNDLE_OBJECTS}/{digest}')
+                except KeyError:
+                    raise ValueError(f'归档中缺少内容: {rel}') from None
+                with zf.open(member) as f:
+                    if store.add_stream(f, rel, link)[0] != digest:
+                        raise ValueError(f'归档中的内容已损坏: {rel}')
+            if progress:
+                progress.advance(1, sizes[digest])
+
+        copy_engine.run_parallel(import_object, needed.items(), workers, progress)
+    return result
+
+
+# 增量归档中记录基础配置、删除列表和变化文件元数据的文件
+DELTA_INFO_NAME = 'delta.json'
+_DELTA_VERSION = 1
+
+
+def diff_manifests(base, target, resolve=None):
+    """
+    比较两个清单
+    :param resolve: 返回None表示两边都忽略该项，默认不忽略
+    :return: (新增或内容变化的{相对路径: 清单项}, 删除的[相对路径])
+    """
+    resolve = resolve or (lambda rel: rel)
+    changed = {}
+    for rel, entry in target.files.items():
+        if not resolve(rel):
+            continue
+        previous = base.files.get(rel)
+        if previous is None or previous['hash'] != entry['hash']:
+            changed[rel] = entry
+    deleted = [rel for rel in base.files if resolve(rel) and rel not in target.files]
+    return changed, deleted
+
+
+def export_delta(store, manifest, base_manifest, base_name, path, extra_files=None, resolve=None,
+                 workers=copy_engine.DEFAULT_WORKERS, level=6, progress=None):
+    """
+    导出相对于基础配置的增量：只包含新增和内容变化的文件，以及删除列表
+    归档结构与完整导出相同，另有delta.json记录基础配置的名称和内容哈希（见Manifest.content_digest）
+    基础配置的内容哈希只计入resolve保留的文件，与完整导出基础配置时归档中的内容一致
+    :param base_manifest: 基础配置的清单
+    :param base_name: 基础配置的名称
+    其余参数见export_zip
+    :return: 各压缩方式的文件数
+    """
+    changed, deleted = diff_manifests(base_manifest, manifest, resolve)
+    resolve = resolve or (lambda rel: rel)
+    delta = {
+        'version': _DELTA_VERSION,
+        'base': {'name': base_name, 'hash': base_manifest.content_digest(resolve)},
+        'deleted': deleted,
+        'files': {rel: {'hash': entry['hash'], 'size': entry['size'], 'mtime': entry['mtime'],
+                        'mode': entry.get('mode') or 0} for rel, entry in changed.items()},
+        'dirs': [rel for rel in manifest.dirs if resolve(rel)]
+    }
+    extra_files = dict(extra_files or {})
+    extra_files[DELTA_INFO_NAME] = json.dumps(delta, ensure_ascii=False).encode('utf-8')
+    # 目录项照常写入，文件只写入变化的部分
+    dirs = set(delta['dirs'])
+    if progress:
+        progress.set_total(len(changed), sum(entry['size'] for entry in changed.values()))
+    return export_zip(store, manifest, path, extra_files,
+                      lambda rel: resolve(rel) if rel in changed or rel in dirs else None, workers, level, progress)
+
+
+def read_delta_info(path):
+    """
+    读取增量归档的基础配置信息
+    :return: {'name': 基础配置名称, 'hash': 基础配置的内容哈希}，不是增量归档时返回None
+    """
+    with zipfile.ZipFile(path) as zf:
+        try:
+            data = json.loads(zf.read(DELTA_INFO_NAME).decode('utf-8'))
+        except KeyError:
+            return None
+    if data.get('version') != _DELTA_VERSION:
+        raise ValueError(f'不支持的归档版本: {data.get("version")}')
+    return data['base']
+
+
+def import_delta(store, path, base_manifest, workers=copy_engine.DEFAULT_WORKERS, progress=None, link=True,
+                 resolve=None):
+    """
+    在本地基础配置的基础上还原增量归档中的配置
+    :param store: 对象仓库
+    :param path: ZIP文件路径
+    :param base_manifest: 本地基础配置的清单
+    :param workers: 并行线程数
+    :param progress: 进度（可选），每处理一个变化的文件前进一次
+    :param link: 是否优先以硬链接将解压出的副本存入仓库，见ObjectStore.add_stream
+    :param resolve: 计算基础配置的内容哈希时使用的筛选，返回None表示不计入该项，应与导出时一致
+    :return: 完整的清单
+    :raise ValueError: 基础配置的内容与制作增量时不同，或归档中的内容缺失、损坏
+    :raise shutil.Error: 部分文件存入失败时抛出
+    """
+    with zipfile.ZipFile(path) as zf:
+        delta = json.loads(zf.read(DELTA_INFO_NAME).decode('utf-8'))
+        if base_manifest.content_digest(resolve) != delta['base']['hash']:
+            raise ValueError(f'基础配置的内容与制作增量时不同: {delta["base"]["name"]}')
+        for rel in list(delta['files']) + delta['deleted'] + delta['dirs']:
+            _member_rel(rel)
+        if progress:
+            progress.set_total(len(delta['files']), sum(entry['size'] for entry in delta['files'].values()))
+
+        def import_member(item):
+            rel, entry = item
+            store.touch(entry['hash'])
+            if not store.has(entry['hash']):
+                try:
+                    member = zf.getinfo(rel)
+                except KeyError:
+                    raise ValueError(f'归档中缺少内容: {rel}') from None
+                with zf.open(member) as f:
+                    if store.add_stream(f, rel, link)[0] != entry['hash']:
+                        raise ValueError(f'归档中的内容已损坏: {rel}')
+            if progress:
+                progress.advance(1, entry['size'])
+
+        copy_engine.run_parallel(import_member, delta['files'].items(), workers, progress)
+
+    deleted = set(delta['deleted'])
+    files = {rel: entry for rel, entry in base_manifest.files.items() if rel not in deleted}
+    files.update(delta['files'])
+    return config_store.Manifest(files, delta['dirs'])
@@ -0,0 +1,1378 @@
+import collections
+import collections.abc
+import concurrent.futures
+import errno
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import stat
+import struct
+import threading
+import time
+import urllib.request
+import uuid
+import zlib
+
+import copy_engine
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+# 每个配置目录下的文件清单名称
+MANIFEST_NAME = 'manifest.bin'
+# 旧版本使用的JSON清单名称
+JSON_MANIFEST_NAME = 'manifest.json'
+
+# 清单文件格式，均为小端序
+_MAGIC = b'KRMF'
+_VERSION = 1
+# 魔数、版本、文件数、目录数、文件总大小、字符串表偏移
+_HEADER = struct.Struct('<4sHxxIIQQ')
+# 路径偏移、路径长度、大小、修改时间(纳秒)、inode、权限、SHA-256
+_FILE_RECORD = struct.Struct('<IIQqQI32s')
+# 路径偏移、路径长度
+_DIR_RECORD = struct.Struct('<II')
+
+# 读取文件时的缓冲区大小
+_BUFFER_SIZE = 1024 * 1024
+
+
+class Throttle:
+    """限制读取速度，可在多个线程之间共享"""
+
+    def __init__(self, rate):
+        """:param rate: 每秒允许读取的字节数"""
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def consume(self, size):
+        """登记读取了size字节，超出速度时等待"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_time, now)
+            self._next_time = start + size / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def hash_stream(f, throttle=None):
+    """
+    计算已打开的二进制文件剩余内容的SHA-256哈希
+    :param throttle: 限速器（可选）
+    """
+    h = hashlib.sha256()
+    while True:
+        data = f.read(_BUFFER_SIZE)
+        if not data:
+            break
+        if throttle:
+            throttle.consume(len(data))
+        h.update(data)
+    return h.hexdigest()
+
+
+def hash_file(path, throttle=None):
+    """
+    计算文件内容的SHA-256哈希
+    :param throttle: 限速器（可选）
+    """
+    with open(path, 'rb') as f:
+        return hash_stream(f, throttle)
+
+
+class PathFilter:
+    """
+    按glob规则筛选清单中的相对路径，不区分大小写
+    不含'/'的规则匹配任意层级的文件/目录名，含'/'的规则匹配完整的相对路径（如'resources/pykrita/*'）
+    """
+
+    def __init__(self, include=(), exclude=()):
+        """
+        :param include: 文件需要匹配其中之一才会被保留，为空表示保留全部文件；不影响目录的遍历
+        :param exclude: 匹配的文件被跳过，匹配的目录连同其内容整体跳过
+        """
+        self._include = self._compile(include)
+        self._exclude = self._compile(exclude)
+        # 用于区分不同规则的缓存键
+        self.key = (tuple(include), tuple(exclude))
+
+    @staticmethod
+    def _compile(patterns):
+        names = [fnmatch.translate(p.lower()) for p in patterns if '/' not in p]
+        paths = [fnmatch.translate(p.lower()) for p in patterns if '/' in p]
+        return (re.compile('|'.join(names)) if names else None,
+                re.compile('|'.join(paths)) if paths else None)
+
+    @staticmethod
+    def _match(compiled, rel):
+        names, paths = compiled
+        rel = rel.lower()
+        return bool((names and names.match(rel.rpartition('/')[2])) or (paths and paths.match(rel)))
+
+    def excludes(self, rel, is_dir=False):
+        """相对路径是否应被跳过"""
+        if self._match(self._exclude, rel):
+            return True
+        if is_dir or self._include == (None, None):
+            return False
+        return not self._match(self._include, rel)
+
+    def excludes_tree(self, rel, is_dir=False):
+        """与excludes相同，但同时检查各级上级目录（前缀本身除外），用于不是通过遍历得到的路径，例如清单中的路径"""
+        parts = rel.split('/')
+        for index in range(2, len(parts)):
+            if self._match(self._exclude, '/'.join(parts[:index])):
+                return True
+        return self.excludes(rel, is_dir)
+
+
+def scan_tree(root, prefix, path_filter=None, excluded=None):
+    """
+    遍历目录树
+    :param root: 要遍历的目录
+    :param prefix: 清单中该目录对应的相对路径前缀
+    :param path_filter: 筛选规则（可选），被排除的目录在遍历时直接跳过，不会进入
+    :param excluded: 列表（可选），被排除的文件和目录以(相对路径, 绝对路径)追加到其中，被排除目录的内容不再单独列出
+    :return: (文件列表[(相对路径, 绝对路径)], 目录列表[相对路径])，目录列表包含前缀本身
+    """
+    files = []
+    dirs = [prefix]
+    stack = [(root, prefix)]
+    while stack:
+        path, rel = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                entry_rel = f'{rel}/{entry.name}'
+                is_dir = entry.is_dir()
+                if path_filter and path_filter.excludes(entry_rel, is_dir):
+                    if excluded is not None:
+                        excluded.append((entry_rel, entry.path))
+                    continue
+                if is_dir:
+                    dirs.append(entry_rel)
+                    stack.append((entry.path, entry_rel))
+                else:
+                    files.append((entry_rel, entry.path))
+    return files, dirs
+
+
+class SizeEstimator:
+    """
+    并行遍历目录树，快速估算总大小和文件数
+    每个目录的统计按目录的修改时间缓存：目录中增删文件会改变其修改时间，未变化的目录不再重新列出。
+    原地修改文件内容不会改变目录的修改时间，因此结果只是估算
+    """
+
+    def __init__(self, workers=copy_engine.DEFAULT_WORKERS):
+        self.workers = workers
+        # (目录路径, 相对路径, 筛选规则) -> (修改时间, 直接包含的文件总大小, 直接包含的文件数, [(子目录路径, 子目录相对路径)])
+        self._cache = {}
+
+    def _scan_dir(self, path, rel, path_filter):
+        key = (path, rel, path_filter.key if path_filter else None)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            cached = self._cache.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1:]
+            size = count = 0
+            subdirs = []
+            with os.scandir(path) as it:
+                for entry in it:
+                    entry_rel = f'{rel}/{entry.name}'
+                    is_dir = entry.is_dir()
+                    if path_filter and path_filter.excludes(entry_rel, is_dir):
+                        continue
+                    if is_dir:
+                        subdirs.append((entry.path, entry_rel))
+                    else:
+                        size += entry.stat().st_size
+                        count += 1
+        except OSError:
+            # 遍历期间被删除或无权访问的目录按空目录计
+            return 0, 0, []
+        self._cache[key] = (mtime, size, count, subdirs)
+        return size, count, subdirs
+
+    def estimate(self, root, prefix, path_filter=None):
+        """
+        :param root: 要估算的目录
+        :param prefix: 该目录对应的相对路径前缀，筛选规则按此匹配，见scan_tree
+        :param path_filter: 筛选规则（可选）
+        :return: (总字节数, 文件数)，目录不存在时为(0, 0)
+        """
+        if not os.path.isdir(root):
+            return 0, 0
+        total = count = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._scan_dir, root, prefix, path_filter)}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    size, files, subdirs = future.result()
+                    total += size
+                    count += files
+                    for path, rel in subdirs:
+                        pending.add(executor.submit(self._scan_dir, path, rel, path_filter))
+        return total, count
+
+
+def free_space(path):
+    """路径所在磁盘的可用字节数，路径不存在时按最近的已存在上级目录计算"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def _open_gzip(path, mode):
+    return gzip.open(path, mode, compresslevel=6)
+
+
+def _open_lzma(path, mode):
+    return lzma.open(path, mode, preset=3) if 'w' in mode else lzma.open(path, mode)
+
+
+# 压缩方式 -> (对象文件后缀, 打开函数)
+COMPRESSORS = {
+    'gzip': ('.gz', _open_gzip),
+    'lzma': ('.xz', _open_lzma)
+}
+if zstd is not None:
+    COMPRESSORS['zstd'] = ('.zst', zstd.open)
+
+# 本身已经压缩过的格式，再次压缩几乎没有收益
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.webp', '.gif', '.kra', '.ora', '.bundle', '.zip', '.gz', '.xz', '.bz2', '.7z',
+    '.zst', '.rar', '.mp3', '.ogg', '.mp4', '.webm'
+}
+
+# 压缩后至少要比原始大小小这么多才保存压缩版本
+_MIN_COMPRESSION_RATIO = 0.95
+
+# 大于该大小的文件按内容切块保存，块级去重
+CHUNK_THRESHOLD = 8 * 1024 * 1024
+# 分块记录文件的后缀，内容为每行一个"块哈希 块大小"
+_CHUNKS_SUFFIX = '.chunks'
+# 块大小的上下限，平均块大小约为 _CHUNK_MIN + 256 * (_CHUNK_MASK + 1)，即约1.25MiB
+_CHUNK_MIN = 256 * 1024
+_CHUNK_MAX = 4 * 1024 * 1024
+_CHUNK_MASK = 0xFFF
+# 候选切点为锚字节出现的位置，再用其之前窗口内容的哈希决定是否切分
+_CHUNK_ANCHOR = b'\xa5'
+_CHUNK_WINDOW = 48
+_NON_ANCHOR = re.compile(b'[^\xa5]')
+# 每个块最多判断的候选切点数量，保证任何内容的切块耗时都有上限
+_CHUNK_MAX_CANDIDATES = 16384
+# 切块时每次读取的大小
+_CHUNK_READ_SIZE = 8 * 1024 * 1024
+
+
+def chunk_boundaries(data, final):
+    """
+    按内容计算切分位置：在锚字节处计算其前_CHUNK_WINDOW字节的CRC32，满足掩码时在此切分。
+    切点只取决于局部内容，文件中间插入或删除数据后，其后的切点会重新对齐，未改动部分得到相同的块。
+    查找锚字节和计算CRC都在C代码中完成，避免在Python中逐字节滚动哈希。
+    :param data: 待切分的数据
+    :param final: 是否为文件末尾，否则最后一段不足以确定切点的数据不会被切出
+    :return: 各块的结束位置列表
+    """
+    ends = []
+    start = 0
+    length = len(data)
+    view = memoryview(data)
+    while start < length:
+        pos = start + _CHUNK_MIN
+        limit = min(start + _CHUNK_MAX, length)
+        cut = None
+        candidates = 0
+        while pos < limit:
+            pos = data.find(_CHUNK_ANCHOR, pos, limit)
+            if pos < 0:
+                break
+            candidates += 1
+            if candidates > _CHUNK_MAX_CANDIDATES:
+                # 锚字节过于密集的数据不再逐个判断，按最大块大小切分
+                break
+            if zlib.crc32(view[pos - _CHUNK_WINDOW:pos]) & _CHUNK_MASK == 0:
+                cut = pos
+                break
+            pos += 1
+            if data[pos:pos + 1] == _CHUNK_ANCHOR:
+                # 连续的锚字节（例如填充数据）直接跳过，避免逐字节计算
+                match = _NON_ANCHOR.search(data, pos, limit)
+                pos = match.start() if match else limit
+        if cut is None:
+            if start + _CHUNK_MAX <= length or final:
+                cut = limit
+            else:
+                break
+        ends.append(cut)
+        start = cut
+    return ends
+
+
+# 按SQLite数据库处理的扩展名
+SQLITE_EXTENSIONS = {'.sqlite', '.sqlite3', '.db'}
+
+
+def _backup_sqlite(src, dst):
+    """
+    用SQLite在线备份接口复制数据库，数据库正在被写入时也能得到一致的副本
+    :return: 是否成功，源文件不是SQLite数据库时返回False
+    """
+    uri = 'file:' + urllib.request.pathname2url(os.path.abspath(src)) + '?mode=ro'
+    try:
+        source = sqlite3.connect(uri, uri=True)
+        try:
+            target = sqlite3.connect(dst)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    except sqlite3.DatabaseError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    return True
+
+
+class _ChunkedReader(io.RawIOBase):
+    """按顺序读取分块保存的内容"""
+
+    def __init__(self, store, chunk_digests):
+        super().__init__()
+        self._store = store
+        self._chunks = iter(chunk_digests)
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._current is None:
+                digest = next(self._chunks, None)
+                if digest is None:
+                    return 0
+                self._current = self._store.open(digest)
+            size = self._current.readinto(buffer)
+            if size:
+                return size
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+class ObjectStore:
+    """
+    内容寻址的文件仓库，内容相同的文件在所有配置之间只保存一份
+    对象可以原样保存，也可以压缩保存（文件名带压缩后缀），读取时透明解压；
+    大文件可以按内容切块，以块为单位去重，对象本身只记录块列表
+    """
+
+    def __init__(self, root, compression=None, chunking=False):
+        """
+        :param root: 仓库目录
+        :param compression: 新存入内容使用的压缩方式，COMPRESSORS中的键，None表示不压缩
+        :param chunking: 是否将大文件按内容切块保存
+        """
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.compression = compression
+        self.chunking = chunking
+        # 设备号 -> 能否与仓库建立硬链接，第一次尝试时探测并记录
+        self._link_devices = {}
+        # 存入和还原内容时使用的复制器
+        self.copier = copy_engine.CopyBackend()
+        # 垃圾回收期间被存入或引用的内容哈希，回收不会删除这些内容；None表示没有正在进行的回收
+        self._touched = None
+        self._touched_lock = threading.Lock()
+
+    def object_path(self, digest):
+        """获取哈希对应的未压缩对象文件路径"""
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _find(self, digest):
+        """
+        查找实际保存的对象文件
+        :return: (对象文件路径, 打开函数)，未压缩时打开函数为None；不存在时返回(None, None)
+        """
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return path, None
+        for suffix, opener in COMPRESSORS.values():
+            if os.path.exists(path + suffix):
+                return path + suffix, opener
+        if os.path.exists(path + _CHUNKS_SUFFIX):
+            return path + _CHUNKS_SUFFIX, self._open_chunked
+        return None, None
+
+    def has(self, digest):
+        """仓库中是否已有该内容"""
+        return self._find(digest)[0] is not None
+
+    def touch(self, digest):
+        """记录内容正在被使用，正在进行的垃圾回收不会删除它（分块内容连同它的块），应在判断内容是否存在之前调用"""
+        with self._touched_lock:
+            if self._touched is None:
+                return
+            self._touched.add(digest)
+        chunk_digests = self.references(digest)
+        if chunk_digests:
+            with self._touched_lock:
+                if self._touched is not None:
+                    self._touched.update(chunk_digests)
+
+    def is_touched(self, digest):
+        with self._touched_lock:
+            return self._touched is not None and digest in self._touched
+
+    def begin_tracking(self):
+        """开始记录被使用的内容，由垃圾回收在标记前调用"""
+        with self._touched_lock:
+            self._touched = set()
+
+    def end_tracking(self):
+        with self._touched_lock:
+            self._touched = None
+
+    def add_file(self, src, link=False, name=None, digest=None):
+        """
+        将文件内容存入仓库，已存在的内容不会重复写入
+        :param src: 源文件路径
+        :param link: 是否优先以硬链接方式存入（仅用于之后不会再被修改的源文件，例如导入时解压出的临时文件）
+        :param name: 用于判断文件类型的文件名，默认为源文件路径
+        :param digest: 已知的内容哈希，省去重新计算
+        :return: 内容哈希
+        """
+        digest = digest or hash_file(src)
+        self.touch(digest)
+        if not self.has(digest):
+            os.makedirs(os.path.dirname(self.object_path(digest)), exist_ok=True)
+            compressible = os.path.splitext(name or src)[1].lower() not in INCOMPRESSIBLE_EXTENSIONS
+            if self.chunking and os.path.getsize(src) >= CHUNK_THRESHOLD:
+                self._add_chunked(src, digest, compressible)
+            elif self.compression and compressible and self._compress(src, digest):
+                pass
+            elif not (link and self._link(src, digest)):
+                self._copy(src, digest)
+        return digest
+
+    def add_volatile_file(self, src):
+        """
+        存入可能正在被修改的文件：先复制到仓库的临时目录，再从这份副本计算哈希并存入，保证对象内容与哈希一致。
+        SQLite数据库使用在线备份接口复制，得到的是一致的数据库，而不是写入到一半的页面
+        :param src: 源文件路径
+        :return: (内容哈希, 存入内容的大小)，SQLite数据库的备份大小与源文件不同
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            if os.path.splitext(src)[1].lower() not in SQLITE_EXTENSIONS or not _backup_sqlite(src, tmp_path):
+                self.copier.copy_file(src, tmp_path)
+            size = os.path.getsize(tmp_path)
+            return self.add_file(tmp_path, link=True, name=src), size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add_stream(self, f, name, link=True):
+        """
+        存入文件对象中的内容（例如归档中的文件）：边写入仓库的临时目录边计算哈希，再从这份副本存入
+        :param f: 二进制文件对象
+        :param name: 用于判断文件类型的文件名
+        :param link: 是否优先将这份副本以硬链接存入，为False时总是复制
+        :return: (内容哈希, 大小)
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as fdst:
+                while True:
+                    data = f.read(_BUFFER_SIZE)
+                    if not data:
+                        break
+                    sha256.update(data)
+                    fdst.write(data)
+                    size += len(data)
+            return self.add_file(tmp_path, link=link, name=name, digest=sha256.hexdigest()), size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _link(self, src, digest):
+        """尝试以硬链接存入，跨设备或文件系统不支持时返回False"""
+        dev = os.stat(src).st_dev
+        if dev not in self._link_devices:
+            os.makedirs(self.root, exist_ok=True)
+            self._link_devices[dev] = dev == os.stat(self.root).st_dev
+        if not self._link_devices[dev]:
+            return False
+        try:
+            os.link(src, self.object_path(digest))
+        except FileExistsError:
+            pass
+        except OSError:
+            # 例如FAT32、网络共享等不支持硬链接的文件系统，此后该设备直接复制
+            self._link_devices[dev] = False
+            return False
+        return True
+
+    def _copy(self, src, digest):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            self.copier.copy_file(src, tmp_path)
+            os.replace(tmp_path, self.object_path(digest))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _compress(self, src, digest):
+        """压缩存入，压缩效果不明显时放弃并返回False"""
+        suffix, opener = COMPRESSORS[self.compression]
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            with open(src, 'rb') as fsrc, opener(tmp_path, 'wb') as fdst:
+                shutil.copyfileobj(fsrc, fdst, _BUFFER_SIZE)
+            if os.path.getsize(tmp_path) > os.path.getsize(src) * _MIN_COMPRESSION_RATIO:
+                return False
+            os.replace(tmp_path, self.object_path(digest) + suffix)
+            return True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _add_chunked(self, src, digest, compressible):
+        """按内容切块存入，已存在的块不会重复写入，最后写入块列表"""
+        recipe = []
+        carry = b''
+        with open(src, 'rb') as f:
+            while True:
+                block = f.read(_CHUNK_READ_SIZE)
+                final = not block
+                data = carry + block
+                start = 0
+                for end in chunk_boundaries(data, final):
+                    chunk = data[start:end]
+                    chunk_digest = hashlib.sha256(chunk).hexdigest()
+                    self.touch(chunk_digest)
+                    if not self.has(chunk_digest):
+                        self._store_bytes(chunk_digest, chunk, compressible)
+                    recipe.append(f'{chunk_digest} {len(chunk)}\n')
+                    start = end
+                carry = data[start:]
+                if final:
+                    break
+
+        self._write_atomic(self.object_path(digest) + _CHUNKS_SUFFIX, ''.join(recipe).encode('ascii'))
+
+    def _store_bytes(self, digest, data, compressible):
+        """将内存中的数据作为一个对象存入"""
+        os.makedirs(os.path.dirname(self.object_path(digest)), exist_ok=True)
+        if self.compression and compressible:
+            suffix, opener = COMPRESSORS[self.compression]
+            tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            try:
+                with opener(tmp_path, 'wb') as f:
+                    f.write(data)
+                if os.path.getsize(tmp_path) <= len(data) * _MIN_COMPRESSION_RATIO:
+                    os.replace(tmp_path, self.object_path(digest) + suffix)
+                    return
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self._write_atomic(self.object_path(digest), data)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def references(self, digest):
+        """分块保存的内容所引用的块哈希列表，未分块时为空"""
+        try:
+            with open(self.object_path(digest) + _CHUNKS_SUFFIX, 'r', encoding='ascii') as f:
+                return [line.split()[0] for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _open_chunked(self, path, mode):
+        with open(path, 'r', encoding='ascii') as f:
+            chunk_digests = [line.split()[0] for line in f if line.strip()]
+        return io.BufferedReader(_ChunkedReader(self, chunk_digests), _BUFFER_SIZE)
+
+    def open(self, digest):
+        """以二进制只读方式打开内容，压缩保存的内容会被透明解压"""
+        path, opener = self._find(digest)
+        if path is None:
+            raise FileNotFoundError(errno.ENOENT, '仓库中缺少内容', self.object_path(digest))
+        return opener(path, 'rb') if opener else open(path, 'rb')
+
+    def copy_to(self, digest, dst):
+        """将仓库中的内容复制到目标路径，压缩保存的内容边解压边写入"""
+        path, opener = self._find(digest)
+        if opener is None:
+            self.copier.copy_file(path or self.object_path(digest), dst)
+            return
+        with opener(path, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, _BUFFER_SIZE)
+
+    def stored_size(self, digest):
+        """内容在仓库中实际占用的字节数"""
+        path = self._find(digest)[0]
+        return os.path.getsize(path) if path else 0
+
+    def check(self, digest, throttle=None):
+        """
+        重新计算内容哈希并与记录比较
+        :return: None表示正常，'missing'表示内容丢失，'corrupted'表示内容已损坏或无法读取
+        """
+        if not self.has(digest):
+            return 'missing'
+        try:
+            with self.open(digest) as f:
+                return None if hash_stream(f, throttle) == digest else 'corrupted'
+        except Exception:
+            # 包括解压时的各种格式错误
+            return 'corrupted'
+
+    def list_objects(self):
+        """列出仓库中实际存在的全部内容哈希"""
+        digests = set()
+        if not os.path.isdir(self.root):
+            return digests
+        with os.scandir(self.root) as it:
+            for fan_out in it:
+                if len(fan_out.name) != 2 or not fan_out.is_dir():
+                    continue
+                with os.scandir(fan_out.path) as objects:
+                    digests.update(fan_out.name + entry.name.split('.')[0] for entry in objects)
+        return digests
+
+    def remove(self, digest):
+        """删除仓库中的内容（包括全部压缩形式和块列表，块本身由调用方根据references处理）"""
+        path = self.object_path(digest)
+        for suffix in ['', _CHUNKS_SUFFIX] + [suffix for suffix, _ in COMPRESSORS.values()]:
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class _MappedFiles(collections.abc.Mapping):
+    """
+    按需解码的只读文件表，直接建立在清单文件的内容（bytes或mmap）之上
+    记录按路径排序，单项查找为二分查找，遍历时顺序解码
+    """
+
+    def __init__(self, buffer, count, records_offset, strings_offset):
+        self._buffer = buffer
+        self._count = count
+        self._records_offset = records_offset
+        self._strings_offset = strings_offset
+
+    def _record(self, index):
+        return _FILE_RECORD.unpack_from(self._buffer, self._records_offset + index * _FILE_RECORD.size)
+
+    def _path(self, record):
+        start = self._strings_offset + record[0]
+        return bytes(self._buffer[start:start + record[1]]).decode('utf-8')
+
+    @staticmethod
+    def _entry(record):
+        _, _, size, mtime, ino, mode, digest = record
+        return {'hash': digest.hex(), 'size': size, 'mtime': mtime, 'ino': ino, 'mode': mode}
+
+    def __getitem__(self, rel):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            path = self._path(record)
+            if path == rel:
+                return self._entry(record)
+            if path < rel:
+                low = middle + 1
+            else:
+                high = middle
+        raise KeyError(rel)
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self._path(self._record(index))
+
+    def __len__(self):
+        return self._count
+
+    def items(self):
+        for index in range(self._count):
+            record = self._record(index)
+            yield self._path(record), self._entry(record)
+
+    def values(self):
+        for index in range(self._count):
+            yield self._entry(self._record(index))
+
+    def digests(self):
+        """只解码哈希字段"""
+        return {self._record(index)[6].hex() for index in range(self._count)}
+
+
+class Manifest:
+    """
+    单个配置的文件清单，记录每个文件的路径、大小、修改时间、权限和内容哈希
+    保存为紧凑的二进制格式：固定长度的头部和按路径排序的定长记录，路径集中存放在末尾的字符串表中。
+    读取时不解析整个文件，记录在访问时才解码，因此十万级文件的清单也能立即加载，并且可以直接mmap
+    """
+
+    def __init__(self, files=None, dirs=None, total_size=None):
+        # 相对路径 -> {'hash': 内容哈希, 'size': 大小, 'mtime': 修改时间(纳秒), 'ino': 快照时源文件的inode, 'mode': 权限}
+        self.files = files if files is not None else {}
+        self.dirs = dirs if dirs is not None else []
+        self._total_size = total_size
+
+    @classmethod
+    def load(cls, path, mapped=False):
+        """
+        读取清单
+        :param path: 清单路径，不存在时会尝试读取同目录下旧版本的JSON清单
+        :param mapped: 是否使用mmap映射文件而不是读入内存（Windows上映射期间该文件无法被替换或删除）
+        """
+        if not os.path.exists(path):
+            json_path = os.path.join(os.path.dirname(path), JSON_MANIFEST_NAME)
+            if os.path.exists(json_path):
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                return cls(data.get('files'), data.get('dirs'))
+
+        with open(path, 'rb') as f:
+            if mapped:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+
+        magic, version, file_count, dir_count, total_size, strings_offset = _HEADER.unpack_from(buffer, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'无法识别的清单文件: {path}')
+
+        records_offset = _HEADER.size
+        dirs_offset = records_offset + file_count * _FILE_RECORD.size
+        dirs = []
+        for index in range(dir_count):
+            offset, length = _DIR_RECORD.unpack_from(buffer, dirs_offset + index * _DIR_RECORD.size)
+            start = strings_offset + offset
+            dirs.append(bytes(buffer[start:start + length]).decode('utf-8'))
+
+        return cls(_MappedFiles(buffer, file_count, records_offset, strings_offset), dirs, total_size)
+
+    def save(self, path):
+        """原子地保存清单，避免中断时留下半个文件"""
+        strings = bytearray()
+
+        def add_string(text):
+            data = text.encode('utf-8')
+            offset = len(strings)
+            strings.extend(data)
+            return offset, len(data)
+
+        file_records = []
+        for rel, entry in sorted(self.files.items()):
+            offset, length = add_string(rel)
+            file_records.append(_FILE_RECORD.pack(offset, length, entry['size'], entry['mtime'],
+                                                  entry.get('ino') or 0, entry.get('mode') or 0,
+                                                  bytes.fromhex(entry['hash'])))
+        dir_records = [_DIR_RECORD.pack(*add_string(rel)) for rel in self.dirs]
+
+        strings_offset = _HEADER.size + len(file_records) * _FILE_RECORD.size + len(dir_records) * _DIR_RECORD.size
+        header = _HEADER.pack(_MAGIC, _VERSION, len(file_records), len(dir_records), self.total_size(),
+                              strings_offset)
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(b''.join(file_records))
+            f.write(b''.join(dir_records))
+            f.write(strings)
+        os.replace(tmp_path, path)
+
+        # 旧版本的JSON清单已被取代
+        json_path = os.path.join(os.path.dirname(path), JSON_MANIFEST_NAME)
+        if os.path.exists(json_path):
+            os.remove(json_path)
+
+    def digests(self):
+        """清单引用的全部内容哈希"""
+        if isinstance(self.files, _MappedFiles):
+            return self.files.digests()
+        return {entry['hash'] for entry in self.files.values()}
+
+    def content_digest(self, resolve=None):
+        """
+        只由路径和内容决定的清单哈希，与修改时间等元数据无关，用于确认不同机器上的同一配置内容相同
+        :param resolve: 返回None表示不计入该项（例如被筛选规则排除、不会被导出的文件），默认计入全部文件
+        """
+        h = hashlib.sha256()
+        for rel, entry in sorted(self.files.items()):
+            if resolve and not resolve(rel):
+                continue
+            h.update(f'{rel}\0{entry["hash"]}\n'.encode('utf-8'))
+        return h.hexdigest()
+
+    def total_size(self):
+        """全部文件的总大小，已保存的清单直接从头部读取"""
+        if self._total_size is None:
+            return sum(entry['size'] for entry in self.files.values())
+        return self._total_size
+
+
+# 在线快照时，文件在存入期间发生变化的最多尝试次数
+_ONLINE_RETRIES = 3
+
+
+def _inode(st):
+    """
+    清单中记录的inode：Windows上ReFS/Dev Drive的文件ID最长128位（Python 3.12+），只保留低64位以放入清单记录。
+    inode只与大小、修改时间一起用于判断文件是否未修改，截断不影响正确性
+    """
+    return st.st_ino & 0xFFFFFFFFFFFFFFFF
+
+
+def _is_unchanged(entry, st):
+    """根据大小、修改时间和inode判断文件自上次快照后是否未被修改"""
+    return (entry['size'] == st.st_size
+            and entry['mtime'] == st.st_mtime_ns
+            and entry.get('ino') == _inode(st))
+
+
+def snapshot(store, files, dirs, parent=None, link=False, workers=copy_engine.DEFAULT_WORKERS, online=False,
+             progress=None):
+    """
+    将文件存入仓库并生成清单，文件并行处理
+    :param store: 对象仓库
+    :param files: [(相对路径, 绝对路径)]
+    :param dirs: [相对路径]
+    :param parent: 上一次快照的清单（可选），未修改的文件直接引用其中的内容，不再读取
+    :param link: 是否以硬链接方式存入新内容，见ObjectStore.add_file
+    :param workers: 并行线程数
+    :param online: 源文件是否可能正在被修改（Krita正在运行），见ObjectStore.add_volatile_file。
+                   存入前后文件发生变化时会重试，多次重试仍在变化的文件以最后一次的内容为准；
+                   存入期间被删除的文件不记入清单
+    :param progress: 进度（可选），每存入一个文件前进一次，见task_manage.Progress
+    :return: 清单
+    :raise shutil.Error: 部分文件存入失败时抛出，包含全部出错的文件
+    """
+    def store_file(item):
+        rel, src = item
+        previous = parent.files.get(rel) if parent else None
+        if previous:
+            store.touch(previous['hash'])
+        # WAL模式下的写入只进入-wal文件，主文件的大小和修改时间不变，在线快照时不能据此认为数据库未修改
+        reusable = not (online and os.path.splitext(src)[1].lower() in SQLITE_EXTENSIONS)
+        try:
+            for _ in range(_ONLINE_RETRIES if online else 1):
+                st = os.stat(src)
+                size = st.st_size
+                if reusable and previous and _is_unchanged(previous, st) and store.has(previous['hash']):
+                    digest = previous['hash']
+                    break
+                if not online:
+                    digest = store.add_file(src, link)
+                    break
+                digest, size = store.add_volatile_file(src)
+                after = os.stat(src)
+                if after.st_size == st.st_size and after.st_mtime_ns == st.st_mtime_ns:
+                    break
+            else:
+                print(f"[WARN] 快照期间文件一直在变化: {src}")
+        except FileNotFoundError:
+            if not online:
+                raise
+            # Krita运行时删除的文件（如临时文件、被删除的资源），与遍历之后才删除一样不记入清单
+            print(f"[INFO] 快照期间文件已被删除: {src}")
+            return None
+        if progress:
+            progress.advance(1, size)
+        return {
+            'hash': digest,
+            'size': size,
+            'mtime': st.st_mtime_ns,
+            'ino': _inode(st),
+            'mode': stat.S_IMODE(st.st_mode)
+        }
+
+    files = list(files)
+    entries = copy_engine.run_parallel(store_file, files, workers, progress)
+    manifest = Manifest(dirs=list(dirs))
+    for (rel, _), entry in zip(files, entries):
+        if entry is not None:
+            manifest.files[rel] = entry
+    return manifest
+
+
+def _restore_metadata(path, entry):
+    """恢复新写入文件的修改时间和权限"""
+    if entry.get('mode'):
+        os.chmod(path, entry['mode'])
+    os.utime(path, ns=(entry['mtime'], entry['mtime']))
+
+
+def checkout(store, manifest, resolve, workers=copy_engine.DEFAULT_WORKERS, progress=None):
+    """
+    将清单中的文件从仓库还原到磁盘，先按顺序创建目录，再并行复制文件并恢复修改时间和权限
+    :param store: 对象仓库
+    :param manifest: 清单
+    :param resolve: 将相对路径映射为目标绝对路径的函数，返回None表示跳过该项
+    :param workers: 并行线程数
+    :param progress: 进度（可选），每还原一个文件前进一次
+    :raise shutil.Error: 部分文件还原失败时抛出，包含全部出错的文件
+    """
+    created = set()
+    for rel in manifest.dirs:
+        target = resolve(rel)
+        if target:
+            os.makedirs(target, exist_ok=True)
+            created.add(target)
+
+    tasks = []
+    for rel, entry in manifest.files.items():
+        target = resolve(rel)
+        if not target:
+            continue
+        parent_dir = os.path.dirname(target)
+        if parent_dir not in created:
+            os.makedirs(parent_dir, exist_ok=True)
+            created.add(parent_dir)
+        tasks.append((entry, target))
+
+    def restore_file(task):
+        entry, target = task
+        store.copy_to(entry['hash'], target)
+        _restore_metadata(target, entry)
+        if progress:
+            progress.advance(1, entry['size'])
+
+    copy_engine.run_parallel(restore_file, tasks, workers, progress)
+
+
+def _matches(path, entry):
+    """
+    判断磁盘上的文件与清单项内容是否相同
+    大小和修改时间都相同时直接视为相同；只有修改时间不同时比较内容哈希，相同则顺便修正修改时间
+    """
+    st = os.stat(path)
+    if st.st_size != entry['size']:
+        return False
+    if st.st_mtime_ns == entry['mtime']:
+        return True
+    if hash_file(path) == entry['hash']:
+        os.utime(path, ns=(entry['mtime'], entry['mtime']))
+        return True
+    return False
+
+
+def sync(store, manifest, live_files, live_dirs, resolve, workers=copy_engine.DEFAULT_WORKERS, progress=None):
+    """
+    增量应用：只修改磁盘上与清单不同的文件，判断方式见_matches
+    :param store: 对象仓库
+    :param manifest: 目标清单
+    :param live_files: 磁盘上现有的文件[(相对路径, 绝对路径)]，相对路径与清单一致
+    :param live_dirs: 磁盘上现有的目录[相对路径]
+    :param resolve: 将相对路径映射为目标绝对路径的函数，返回None表示跳过该项
+    :param workers: 并行线程数
+    :param progress: 进度（可选），每处理一个清单中的文件前进一次。取消时已处理的文件不会恢复
+    :return: 各类操作的文件数 {'added', 'updated', 'removed', 'unchanged'}
+    :raise shutil.Error: 部分文件处理失败时抛出，包含全部出错的文件
+    """
+    stats = collections.Counter()
+    live = dict(live_files)
+
+    # 先删除多余的文件和目录，同名的文件/目录类型变化也在这一步处理
+    extra_files = [path for rel, path in live.items() if rel not in manifest.files]
+    copy_engine.run_parallel(os.remove, extra_files, workers)
+    stats['removed'] += len(extra_files)
+
+    wanted_dirs = set(manifest.dirs)
+    for rel in sorted(set(live_dirs) - wanted_dirs, key=len):
+        target = resolve(rel)
+        if target:
+            shutil.rmtree(target, ignore_errors=True)
+
+    for rel in manifest.dirs:
+        target = resolve(rel)
+        if target:
+            os.makedirs(target, exist_ok=True)
+
+    def sync_file(item):
+        rel, entry = item
+        target = live.get(rel) or resolve(rel)
+        if not target:
+            return None
+        if progress:
+            progress.advance(1, entry['size'])
+        if rel in live:
+            if _matches(target, entry):
+                return 'unchanged'
+            status = 'updated'
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            status = 'added'
+        store.copy_to(entry['hash'], target)
+        os.utime(target, ns=(entry['mtime'], entry['mtime']))
+        return status
+
+    for status in copy_engine.run_parallel(sync_file, manifest.files.items(), workers, progress):
+        if status:
+            stats[status] += 1
+    return dict(stats)
+
+
+def stage(store, manifest, live_files, resolve, workers=copy_engine.DEFAULT_WORKERS, progress=None):
+    """
+    在暂存位置构建完整的目标内容，不修改现有文件
+    与现有文件相同的项以硬链接放入暂存位置（不支持硬链接时复制），其余从仓库复制
+    :param store: 对象仓库
+    :param manifest: 目标清单
+    :param live_files: 磁盘上现有的文件[(相对路径, 绝对路径)]，相对路径与清单一致
+    :param resolve: 将相对路径映射为暂存位置绝对路径的函数，返回None表示跳过该项
+    :param workers: 并行线程数
+    :param progress: 进度（可选），每放入一个文件前进一次
+    :return: 各类操作的文件数 {'linked', 'copied'}
+    :raise shutil.Error: 部分文件处理失败时抛出，包含全部出错的文件
+    """
+    stats = collections.Counter()
+    live = dict(live_files)
+    # 第一次硬链接失败后不再尝试
+    link_state = {'supported': True}
+
+    for rel in manifest.dirs:
+        target = resolve(rel)
+        if target:
+            os.makedirs(target, exist_ok=True)
+
+    def stage_file(item):
+        rel, entry = item
+        target = resolve(rel)
+        if not target:
+            return None
+        if progress:
+            progress.advance(1, entry['size'])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        source = live.get(rel)
+        if source and _matches(source, entry):
+            if link_state['supported']:
+                try:
+                    os.link(source, target)
+                    return 'linked'
+                except OSError:
+                    link_state['supported'] = False
+            store.copier.copy_file(source, target)
+        else:
+            store.copy_to(entry['hash'], target)
+        _restore_metadata(target, entry)
+        return 'copied'
+
+    for status in copy_engine.run_parallel(stage_file, manifest.files.items(), workers, progress):
+        if status:
+            stats[status] += 1
+    return dict(stats)
+
+
+def swap_in(pairs):
+    """
+    用重命名把暂存内容换入目标位置，任一步失败时按相反顺序改名回滚
+    :param pairs: [(暂存路径, 目标路径)]，暂存路径为None表示只移走目标（即删除）
+    :return: 被换下的旧文件/目录路径列表，由调用方在确认成功后删除
+    :raise OSError: 换入失败，已回滚到换入前的状态
+    """
+    done = []
+    try:
+        for staged, target in pairs:
+            old = None
+            if os.path.lexists(target):
+                old = f'{target}.old-{uuid.uuid4().hex[:8]}'
+                os.rename(target, old)
+            done.append((staged, target, old))
+            if staged:
+                os.rename(staged, target)
+    except OSError:
+        for staged, target, old in reversed(done):
+            if staged and not os.path.lexists(staged) and os.path.lexists(target):
+                os.rename(target, staged)
+            if old:
+                os.rename(old, target)
+        raise
+    return [old for _, _, old in done if old]
+
+
+def remove_path(path):
+    """删除文件或目录"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def verify(store, manifests, workers=copy_engine.DEFAULT_WORKERS, throttle=None, progress=None, complete=False):
+    """
+    并行重新计算清单引用的全部内容的哈希并与记录比较，多个配置共享的内容只校验一次
+    :param store: 对象仓库
+    :param manifests: {配置名: 清单}
+    :param workers: 并行线程数
+    :param throttle: 限速器（可选），用于后台校验
+    :param progress: 进度（可选），被取消后不再校验新的内容
+    :param complete: manifests是否包含引用仓库的全部清单，只有这时才统计未被引用的内容
+    :return: {'configs': {配置名: {'missing': [相对路径], 'corrupted': [相对路径]}},
+              'extra': [未被这些清单引用的内容哈希]（complete为False时为None）, 'checked': 校验的内容数, 'bytes': 校验的字节数}
+    :raise task_manage.Cancelled: 校验被取消
+    """
+    owners = collections.defaultdict(list)
+    sizes = {}
+    for name, manifest in manifests.items():
+        for rel, entry in manifest.files.items():
+            owners[entry['hash']].append((name, rel))
+            sizes[entry['hash']] = entry['size']
+
+    digests = list(owners)
+    results = copy_engine.run_parallel(lambda digest: store.check(digest, throttle), digests, workers, progress)
+
+    configs = {name: {'missing': [], 'corrupted': []} for name in manifests}
+    for digest, status in zip(digests, results):
+        if status:
+            for name, rel in owners[digest]:
+                configs[name][status].append(rel)
+
+    extra = None
+    if complete:
+        extra = sorted(store.list_objects() - referenced_objects(store, manifests.values()))
+    return {
+        'configs': configs,
+        'extra': extra,
+        'checked': len(digests),
+        'bytes': sum(sizes.values())
+    }
+
+
+def footprint(store, manifest):
+    """
+    统计配置的磁盘占用
+    :return: {'logical': 文件原始总大小, 'unique': 去重后的大小, 'stored': 仓库中实际占用（压缩后）}
+    """
+    unique = {}
+    for entry in manifest.files.values():
+        unique[entry['hash']] = entry['size']
+    objects = set(unique)
+    for digest in unique:
+        objects.update(store.references(digest))
+    return {
+        'logical': manifest.total_size(),
+        'unique': sum(unique.values()),
+        'stored': sum(store.stored_size(digest) for digest in objects)
+    }
+
+
+def referenced_objects(store, manifests):
+    """清单直接引用的内容以及分块内容引用的块"""
+    referenced = set()
+    for manifest in manifests:
+        referenced |= manifest.digests()
+    for digest in list(referenced):
+        referenced.update(store.references(digest))
+    return referenced
+
+
+def prune(store, candidates, manifests):
+    """
+    删除不再被任何清单引用的内容
+    :param store: 对象仓库
+    :param candidates: 可能需要删除的内容哈希
+    :param manifests: 仍然存在的全部清单
+    """
+    referenced = referenced_objects(store, manifests)
+    candidates = set(candidates)
+    for digest in list(candidates):
+        candidates.update(store.references(digest))
+    for digest in candidates - referenced:
+        store.remove(digest)
+
+
+# 临时文件和遗留路径超过这个时间（秒）未修改才会被回收，避免删除正在写入的文件
+STALE_AGE = 3600
+
+
+class GarbageCollector:
+    """
+    标记-清除式的仓库垃圾回收：标记全部清单引用的内容，删除其余内容、仓库中遗留的临时文件和调用方给出的遗留路径，
+    最后删除空的分级目录。
+    工作被拆成很小的步骤，可以通过step在时间预算内分多次执行；回收期间新存入或被引用的内容（见ObjectStore.touch）不会被删除
+    """
+
+    def __init__(self, store, manifest_paths, stale_paths=()):
+        """
+        :param store: 对象仓库
+        :param manifest_paths: 全部配置的清单路径，任一清单无法读取时回收会在删除任何内容之前中止
+        :param stale_paths: 需要一并删除的遗留文件/目录
+        """
+        self.store = store
+        # 回收的字节数和删除的文件数
+        self.reclaimed = 0
+        self.removed = 0
+        self.done = False
+        self._manifest_paths = list(manifest_paths)
+        self._stale_paths = list(stale_paths)
+        self._referenced = set()
+        store.begin_tracking()
+        self._steps = self._run()
+
+    def step(self, budget=None):
+        """
+        执行一部分回收工作
+        :param budget: 本次的时间预算（秒），None表示一次执行完
+        :return: 是否已全部完成
+        """
+        deadline = None if budget is None else time.monotonic() + budget
+        try:
+            while not self.done:
+                try:
+                    next(self._steps)
+                except StopIteration:
+                    self.cancel()
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        except Exception:
+            self.cancel()
+            raise
+        return self.done
+
+    def cancel(self):
+        """停止回收，已删除的内容不会恢复"""
+        self.done = True
+        self._steps.close()
+        self.store.end_tracking()
+
+    def _keep(self, digest):
+        return digest in self._referenced or self.store.is_touched(digest)
+
+    def _fan_outs(self):
+        if not os.path.isdir(self.store.root):
+            return []
+        with os.scandir(self.store.root) as it:
+            return [entry.path for entry in it if len(entry.name) == 2 and entry.is_dir()]
+
+    def _remove_file(self, path):
+        """删除文件，仍有其他硬链接的文件不计入回收的字节数"""
+        try:
+            st = os.lstat(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self.removed += 1
+        if st.st_nlink <= 1:
+            self.reclaimed += st.st_size
+
+    def _remove_tree(self, path):
+        """逐个删除目录中的文件，每删除一个文件让出一次"""
+        if not os.path.isdir(path) or os.path.islink(path):
+            self._remove_file(path)
+            return
+        for root, dirs, files in os.walk(path, topdown=False):
+            for name in files:
+                self._remove_file(os.path.join(root, name))
+                yield
+            for name in dirs:
+                full = os.path.join(root, name)
+                if os.path.islink(full):
+                    self._remove_file(full)
+                else:
+                    os.rmdir(full)
+        os.rmdir(path)
+
+    def _run(self):
+        # 标记：清单直接引用的内容
+        for path in self._manifest_paths:
+            manifest = Manifest.load(path)
+            for index, entry in enumerate(manifest.files.values()):
+                self._referenced.add(entry['hash'])
+                if index % 1024 == 1023:
+                    yield
+            yield
+
+        fan_outs = self._fan_outs()
+
+        # 标记：被引用的分块内容引用的块
+        for fan_out in fan_outs:
+            with os.scandir(fan_out) as it:
+                recipes = [entry.name for entry in it if entry.name.endswith(_CHUNKS_SUFFIX)]
+            for name in recipes:
+                digest = os.path.basename(fan_out) + name[:-len(_CHUNKS_SUFFIX)]
+                if digest in self._referenced:
+                    self._referenced.update(self.store.references(digest))
+                yield
+
+        # 清除：未被引用的内容
+        for fan_out in fan_outs:
+            with os.scandir(fan_out) as it:
+                names = [entry.name for entry in it]
+            for name in names:
+                digest = os.path.basename(fan_out) + name.split('.')[0]
+                if len(digest) == 64 and not self._keep(digest):
+                    self._remove_file(os.path.join(fan_out, name))
+                yield
+            # 整理：删除已经空了的分级目录
+            try:
+                os.rmdir(fan_out)
+            except OSError:
+                pass
+
+        # 中断的写入留在临时目录中的文件
+        now = time.time()
+        if os.path.isdir(self.store.tmp_dir):
+            for name in os.listdir(self.store.tmp_dir):
+                path = os.path.join(self.store.tmp_dir, name)
+                try:
+                    if now - os.path.getmtime(path) > STALE_AGE:
+                        self._remove_file(path)
+                except FileNotFoundError:
+                    pass
+                yield
+
+        for path in self._stale_paths:
+            if os.path.lexists(path):
+                yield from self._remove_tree(path)
+            yield
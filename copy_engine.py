@@ -0,0 +1,165 @@
+import collections
+import concurrent.futures
+import errno
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import _winapi
+except ImportError:
+    _winapi = None
+
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+_BUFFER_SIZE = 1024 * 1024
+
+# 并行复制的默认线程数。小文件的复制受系统调用延迟限制而不是带宽，线程数可以多于CPU核数
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# 表示文件系统或内核不支持该复制方式的错误码，遇到这些错误时降级到下一种方式
+_UNSUPPORTED_ERRNO = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EBADF,
+                      errno.EPERM, errno.ENOTSUP}
+
+
+def _reflink(src, dst):
+    """写时复制克隆（btrfs、XFS等），不复制任何数据块"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+
+def _copy_file_range(src, dst):
+    """在内核中复制数据，支持的文件系统上同样会使用克隆或服务端复制"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def _copyfile2(src, dst):
+    """Windows的CopyFile2，在ReFS和Dev Drive上会自动使用块克隆"""
+    _winapi.CopyFile2(src, dst, 0)
+
+
+def _buffered(src, dst):
+    """经过用户空间缓冲区的普通复制"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, _BUFFER_SIZE)
+
+
+def _available_strategies():
+    """按优先级返回当前平台可用的复制方式"""
+    strategies = []
+    if fcntl is not None and hasattr(fcntl, 'ioctl') and os.name == 'posix':
+        strategies.append(('reflink', _reflink))
+    if hasattr(os, 'copy_file_range'):
+        strategies.append(('copy_file_range', _copy_file_range))
+    if _winapi is not None and hasattr(_winapi, 'CopyFile2'):
+        strategies.append(('copyfile2', _copyfile2))
+    strategies.append(('buffered', _buffered))
+    return strategies
+
+
+class CopyBackend:
+    """按源/目标设备选择最快复制方式的文件复制器"""
+
+    def __init__(self):
+        self._strategies = _available_strategies()
+        # (源设备号, 目标设备号) -> 可用复制方式在列表中的起始下标，第一次复制时探测
+        self._device_strategy = {}
+        self._lock = threading.Lock()
+        # 各复制方式的使用次数
+        self.stats = collections.Counter()
+
+    def _device_key(self, src, dst):
+        return os.stat(src).st_dev, os.stat(os.path.dirname(dst) or '.').st_dev
+
+    def copy_file(self, src, dst):
+        """
+        复制文件内容（不含元数据）
+        :param src: 源文件路径
+        :param dst: 目标文件路径
+        :return: 实际使用的复制方式名称
+        """
+        key = self._device_key(src, dst)
+        index = self._device_strategy.get(key, 0)
+        while True:
+            name, func = self._strategies[index]
+            if name == 'buffered':
+                func(src, dst)
+                break
+            try:
+                func(src, dst)
+                break
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNO:
+                    raise
+                # 该设备组合不支持此方式，记录下来，之后直接从下一种方式开始
+                index += 1
+                with self._lock:
+                    self._device_strategy[key] = max(self._device_strategy.get(key, 0), index)
+
+        with self._lock:
+            self.stats[name] += 1
+        return name
+
+    def take_stats(self):
+        """取出并清空复制方式的统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            self.stats.clear()
+        return stats
+
+
+def run_parallel(func, items, workers=DEFAULT_WORKERS, progress=None):
+    """
+    用有限大小的线程池并行处理，单项出错不会中断其他项，全部完成后统一抛出
+    :param func: 处理单项的函数
+    :param items: 待处理的项
+    :param workers: 线程数
+    :param progress: 进度（可选），被取消后不再开始新的项，见task_manage.Progress
+    :return: 与items顺序一致的结果列表
+    :raise shutil.Error: 有项出错时抛出，参数为[(出错的文件路径或项, 错误信息)]
+    :raise task_manage.Cancelled: 操作被取消
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    if workers <= 1 or len(items) <= 1:
+        for i, item in enumerate(items):
+            if progress:
+                progress.check_cancelled()
+            try:
+                results[i] = func(item)
+            except OSError as e:
+                errors.append((e.filename or item, str(e)))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # 限制同时提交的任务数量，避免十万级文件时一次性创建全部Future
+            pending = {}
+            index = 0
+            while index < len(items) or pending:
+                while index < len(items) and len(pending) < workers * 4:
+                    if progress:
+                        progress.check_cancelled()
+                    pending[executor.submit(func, items[index])] = index
+                    index += 1
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    try:
+                        results[i] = future.result()
+                    except OSError as e:
+                        errors.append((e.filename or items[i], str(e)))
+    if errors:
+        raise shutil.Error(errors)
+    return results
@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import platform_dependence
 
 
@@ -8,6 +9,10 @@ class JsonManage:
         self.settings = {}
         self.default_settings = {}
         self.settings_path = None
+        # 设置文件存在但无法读取时的错误信息，此时使用的是默认设置
+        self.load_error = None
+        # 后台任务和界面线程可能同时修改并保存
+        self._lock = threading.RLock()
 
     def _load_settings(self):
         """加载设置文件，如果文件不存在则创建"""
@@ -27,6 +32,7 @@ class JsonManage:
                 self.settings = json.load(f)
         except Exception as e:
             print(f"加载设置失败: {str(e)}")
+            self.load_error = str(e)
             self.settings = self.default_settings.copy()
 
     def set_default_settings(self, default_settings):
@@ -44,26 +50,32 @@ class JsonManage:
 
     def get_all_settings(self):
         """获取所有配置项"""
-        return self.settings.copy()
+        with self._lock:
+            return self.settings.copy()
 
     def set_setting(self, setting_name, value):
         """更新单个配置项并保存"""
-        self.settings[setting_name] = value
-        self.save_settings()
+        with self._lock:
+            self.settings[setting_name] = value
+            self.save_settings()
 
     def update_settings(self, new_settings):
         """批量更新配置项并保存"""
-        self.settings.update(new_settings)
-        self.save_settings()
+        with self._lock:
+            self.settings.update(new_settings)
+            self.save_settings()
 
     def save_settings(self):
-        """保存当前设置到文件"""
+        """保存当前设置到文件，先写入临时文件再替换，中断时不会留下不完整的文件"""
         if not self.settings_path:
             raise ValueError("设置路径未指定")
 
+        tmp_path = f'{self.settings_path}.tmp'
         try:
-            with open(self.settings_path, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, ensure_ascii=False, indent=4)
+            with self._lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.settings, f, ensure_ascii=False, indent=4)
+                os.replace(tmp_path, self.settings_path)
             return True
         except Exception as e:
             print(f"保存设置失败: {str(e)}")
@@ -71,8 +83,9 @@ class JsonManage:
 
     def reset_to_defaults(self):
         """重置为默认设置"""
-        self.settings = self.default_settings.copy()
-        self.save_settings()
+        with self._lock:
+            self.settings = self.default_settings.copy()
+            self.save_settings()
 
 
 class SettingsManager(JsonManage):
@@ -88,7 +101,25 @@ class SettingsManager(JsonManage):
             'use_default_path': True,
             'default_path': platform_dependence.get_default_k_r_path(),
             'first_begin': True,
-            'del-dont-ask': False
+            'del-dont-ask': False,
+            'incremental-snapshot': True,
+            'use-hardlinks': True,
+            # 应用配置的方式：'delta'只改动与配置不同的文件，耗时与差异大小成正比，但中途失败时资源目录只更新了一部分；
+            # 'staged'在暂存目录中构建完整配置后整体换入，失败时不影响现有配置，但耗时与配置大小成正比；
+            # 'full'删除资源目录后完整还原
+            'apply-mode': 'delta',
+            'verify-before-apply': False,
+            'background-verify': False,
+            'verify-rate-mb': 20,
+            'snapshot-compression': None,
+            'chunk-large-files': True,
+            'auto-gc': True,
+            'export-compression-level': 6,
+            # 快照、导出和应用时的文件筛选规则，见config_store.PathFilter
+            # resourcecache.sqlite虽然可以重建，但其中保存着标签和资源的启用状态，因此保留
+            'snapshot-include': [],
+            'snapshot-exclude': ['*.log', '__pycache__', '*.pyc', '*.tmp', '*-journal', '*-wal', '*-shm',
+                                 '.thumbnails', 'thumbnails']
         }
 
         # 设置默认配置和路径
@@ -101,6 +132,18 @@ class SettingsManager(JsonManage):
         # 加载设置
         self.set_settings_path(settings_path)
         self._update_default_k_r_path()
+        self._migrate_apply_mode()
+
+    def _migrate_apply_mode(self):
+        """旧版本用delta-apply和atomic-apply两个开关选择应用方式，转换为apply-mode"""
+        with self._lock:
+            if 'delta-apply' not in self.settings and 'atomic-apply' not in self.settings:
+                return
+            delta = self.settings.pop('delta-apply', True)
+            atomic = self.settings.pop('atomic-apply', True)
+            if 'apply-mode' not in self.settings:
+                self.settings['apply-mode'] = 'delta' if delta else 'staged' if atomic else 'full'
+            self.save_settings()
 
     def _update_default_k_r_path(self):
         if self.get_setting('default_path') != platform_dependence.get_default_k_r_path():
@@ -173,7 +216,27 @@ class LangManager(JsonManage):
                                     '如下目录将被删除！\n{$PATH}\n{$CONFIPATH}',
                 'input-name_disagreement':'该配置组命名\'{$name}\'，与已有配置组重复，请重命名',
                 'error-platform-conflict':'无法导入：该配置组\'{$name}\'，来自\'{#config-platform}\'平台，'
-                                          '与您使用的\'{#platform}\'不同，暂时不支持转换'
+                                          '与您使用的\'{#platform}\'不同，暂时不支持转换',
+                'error-verify-failed':'配置\'{$name}\'校验失败：{$missing}个文件缺失，{$corrupted}个文件损坏',
+                'warning':'警告',
+                'warn-low-space':'磁盘可用空间可能不足：预计需要{$need}，可用{$free}。\n\n是否继续？',
+                'title-bundle':'选择要导入的配置',
+                'error-delta-base-missing':'无法导入：增量配置\'{$name}\'需要本地已有基础配置\'{$base}\'',
+                'error-delta-base-mismatch':'无法导入：本地的基础配置\'{$base}\'与制作增量配置\'{$name}\'时使用的内容不同',
+                'title-delta-base':'导出方式',
+                'delta-base-tips':'可以只导出相对于某个基础配置的变化部分，导入时需要对方已有相同的基础配置：',
+                'full-export':'完整导出',
+                'progress-estimate':'正在估算',
+                'progress-snapshot':'正在保存配置',
+                'progress-verify':'正在校验',
+                'progress-apply':'正在应用配置',
+                'progress-export':'正在导出',
+                'progress-import':'正在导入',
+                'progress-delete':'正在删除',
+                'progress-detail':'{$done}/{$total}个文件  {$speed}/s  剩余{$eta}',
+                'progress-cancelling':'正在取消...',
+                'progress-reset':'正在重置',
+                'error-busy':'有正在进行的操作与此操作冲突，请等待其完成后重试'
 
             }
         }
@@ -260,8 +323,9 @@ class ConfigManager(JsonManage):
         }
 
         # 添加或更新配置
-        self.settings[config_name] = config_info
-        self.save_settings()
+        with self._lock:
+            self.settings[config_name] = config_info
+            self.save_settings()
 
     def remove_config(self, config_name):
         """
@@ -269,11 +333,12 @@ class ConfigManager(JsonManage):
         :param config_name: 要删除的配置方案名称
         :return: 是否成功删除
         """
-        if config_name in self.settings:
-            del self.settings[config_name]
-            self.save_settings()
-            return True
-        return False
+        with self._lock:
+            if config_name in self.settings:
+                del self.settings[config_name]
+                self.save_settings()
+                return True
+            return False
 
     def get_config(self, config_name):
         """
@@ -288,7 +353,8 @@ class ConfigManager(JsonManage):
         获取所有配置方案
         :return: 所有配置方案的字典
         """
-        return self.settings.copy()
+        with self._lock:
+            return self.settings.copy()
 
     def update_config(self, config_name, group_path=None, platform=None):
         """
@@ -298,19 +364,20 @@ class ConfigManager(JsonManage):
         :param platform: 新的配置平台（可选）
         :return: 是否成功更新
         """
-        if config_name not in self.settings:
-            return False
+        with self._lock:
+            if config_name not in self.settings:
+                return False
 
-        config_info = self.settings[config_name]
-        if group_path:
-            config_info['path'] = group_path
-        if platform:
-            config_info['platform'] = platform
+            config_info = self.settings[config_name]
+            if group_path:
+                config_info['path'] = group_path
+            if platform:
+                config_info['platform'] = platform
 
-        # 更新修改时间
-        config_info['time'] = self._get_current_time()
+            # 更新修改时间
+            config_info['time'] = self._get_current_time()
 
-        self.save_settings()
+            self.save_settings()
         return True
 
     @staticmethod
@@ -321,17 +388,25 @@ class ConfigManager(JsonManage):
 
     def output_one_config(self, name, path):
         with open(os.path.join(path, 'configs.json'), 'w', encoding='utf-8') as f:
-            config = self.get_config(name)
-            config['name'] = name
-            json.dump(config, f, ensure_ascii=False, indent=4)
+            f.write(self.dump_one_config(name))
+
+    def dump_one_config(self, name):
+        """生成导出时写入归档的configs.json内容"""
+        config = dict(self.get_config(name))
+        config['name'] = name
+        return json.dumps(config, ensure_ascii=False, indent=4)
 
     def input_one_config(self, path, new_name=None):
         with open(path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            if new_name:
-                config['name'] = new_name
-            name = config.pop('name')
-            self.new_config(name, config['resources_path'], config['platform'])
+            self.add_one_config(json.load(f), new_name)
+
+    def add_one_config(self, config, new_name=None):
+        """登记导入的配置，config为归档中configs.json的内容"""
+        config = dict(config)
+        if new_name:
+            config['name'] = new_name
+        name = config.pop('name')
+        self.new_config(name, config['resources_path'], config['platform'])
 
 config_manager = ConfigManager()
 
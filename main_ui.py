@@ -6,6 +6,7 @@ import darkdetect  # 系统主题检测
 import datetime  # 用于获取当前日期时间
 import os
 import json_manage
+import task_manage
 from PIL import Image, ImageTk
 import platform_dependence
 import tkinter.filedialog as filedialog
@@ -18,6 +19,27 @@ developer = None
 PAD_X = 10
 PAD_Y = 10
 
+# 垃圾回收：启动后延迟开始，每步的时间预算(秒)和步间隔，保证界面不会被明显阻塞
+GC_START_DELAY_MS = 3000
+GC_STEP_BUDGET = 0.005
+GC_STEP_INTERVAL_MS = 20
+
+# 后台校验：与其他读写仓库的操作冲突时稍后重试
+VERIFY_RETRY_MS = 30000
+
+# 工作线程转交给界面线程的调用的处理间隔，进度窗口的刷新间隔（不超过20次/秒）
+UI_DRAIN_INTERVAL_MS = 20
+PROGRESS_REFRESH_MS = 50
+PROGRESS_BAR_MAXIMUM = 1000
+
+# 后台操作的冲突键：配置仓库、Krita资源目录和各个配置，见task_manage.JobExecutor
+STORE_JOB_KEY = 'store'
+RESOURCES_JOB_KEY = 'krita-resources'
+
+
+def config_job_key(name):
+    return f'config:{name}'
+
 language_var_dic = {}
 
 
@@ -54,6 +76,25 @@ def set_style(style: str):
         c()
     json_manage.settings_manager.set_setting('window_style', style)
 
+def format_size(size: int) -> str:
+    """将字节数格式化为便于阅读的字符串"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+def format_duration(seconds) -> str:
+    """将秒数格式化为分:秒，无法估计时返回--:--"""
+    if seconds is None:
+        return '--:--'
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes >= 60:
+        return f'{minutes // 60}:{minutes % 60:02d}:{seconds:02d}'
+    return f'{minutes:02d}:{seconds:02d}'
+
+
 def move_window_center(window: tk.Tk|tk.Toplevel):
     """将窗口移动到屏幕中心"""
     window.update_idletasks()  # 确保获取到最新窗口尺寸
@@ -86,6 +127,13 @@ class RootWindow(tk.Tk):
         self.geometry(json_manage.settings_manager.get_setting('window_size'))
         self.bind('<Configure>', self.on_resize)
 
+        # 在工作线程中执行的操作需要显示对话框时，经由分发器转交到界面线程
+        self.ui_dispatcher = task_manage.UiDispatcher()
+        platform_dependence.set_ui_dispatcher(self.ui_dispatcher)
+        self.after(UI_DRAIN_INTERVAL_MS, self.drain_ui_calls)
+        # 复制、导入导出等操作在后台线程中执行，界面不会被阻塞
+        self.job_executor = task_manage.JobExecutor(self.ui_dispatcher)
+
         # 添加主界面
         self.main_window = MainWindow(self)
         self.main_window.pack(side='top', fill='both', expand=True, padx=PAD_X, pady=PAD_Y)
@@ -112,6 +160,10 @@ class RootWindow(tk.Tk):
 
         self.mainloop()
 
+    def drain_ui_calls(self):
+        self.ui_dispatcher.drain()
+        self.after(UI_DRAIN_INTERVAL_MS, self.drain_ui_calls)
+
     # noinspection PyTypeChecker,PyUnusedLocal
     def on_resize(self, event):
         # 忽略最小化状态下的调整
@@ -120,6 +172,9 @@ class RootWindow(tk.Tk):
 
     def on_closing(self):
         self.save_current_window_size()
+        # 正在执行的操作被取消，等待界面的工作线程不再等待
+        self.job_executor.shutdown()
+        self.ui_dispatcher.close()
         try:
             shutil.rmtree(os.path.join(os.getcwd(),'temp'))
 
@@ -231,6 +286,12 @@ class KritaConfigIcon(ttk.Frame):
         self.label = ttk.Label(self.content_frame, text=name, wraplength=150)
         self.label.pack(side='top', padx=PAD_X, pady=PAD_Y)
 
+        # 配置大小（来自配置清单，不遍历文件）
+        self.size_label = ttk.Label(self.content_frame, text='', font=("Arial", 8))
+        if not is_reset:
+            self.size_label.pack(side='top', padx=PAD_X, pady=(0, PAD_Y))
+            self.update_size()
+
         # 创建底部状态指示器（Canvas）
         self.indicator_height = 3  # 指示器高度
         self.indicator = tk.Canvas(
@@ -255,8 +316,17 @@ class KritaConfigIcon(ttk.Frame):
         self.content_frame.bind("<Button-1>", self.toggle_selection)
         self.icon.bind("<Button-1>", self.toggle_selection)
         self.label.bind("<Button-1>", self.toggle_selection)
+        self.size_label.bind("<Button-1>", self.toggle_selection)
         self.indicator.bind("<Button-1>", self.toggle_selection)
 
+    def update_size(self):
+        """从配置清单读取并显示配置大小"""
+        size = platform_dependence.get_config_size(self.name)
+        if size is None:
+            self.size_label.config(text='')
+        else:
+            self.size_label.config(text=f'{format_size(size[1])} · {size[0]}')
+
     def toggle_selection(self, event=None):
         """切换选中状态，根据多选模式决定行为"""
         if not self.config_list.multi_select.get():
@@ -375,8 +445,20 @@ class ConfigList(ttk.Frame):
         return True, self.config_id
 
     def input_config(self, path, new_name=None):
-        platform_dependence.input_krita_config(path, new_name)
-        self._add_config(new_name)
+        def on_done(is_input):
+            if is_input:
+                self._add_config(new_name)
+
+        run_job(self, platform_dependence.input_krita_config, path, new_name,
+                exclusive=(config_job_key(new_name),), shared=(STORE_JOB_KEY,), on_done=on_done)
+
+    def input_bundle(self, path, names):
+        def on_done(imported):
+            for name in imported or []:
+                self._add_config(name)
+
+        run_job(self, platform_dependence.input_krita_bundle, path, names,
+                exclusive=[config_job_key(name) for name in names.values()], shared=(STORE_JOB_KEY,), on_done=on_done)
 
     def add_config(self, name=None):
         """
@@ -389,17 +471,36 @@ class ConfigList(ttk.Frame):
 
             处理流程:
                 1. 先在UI中添加配置项
-                2. 成功后尝试在文件系统创建配置
-                3. 若文件系统创建失败则回滚UI添加操作
+                2. 成功后在后台线程中创建配置
+                3. 若创建失败或无法开始则回滚UI添加操作
             """
         is_add = self._add_config(name)
         if is_add:
-            _is_add = platform_dependence.new_krita_config(name)
-            if not _is_add[0]:
-                self.config_dic.pop(is_add[1]).destroy()
-                return _is_add
+            config_id = is_add[1]
+
+            def on_done(_is_add):
+                if not _is_add or not _is_add[0]:
+                    self.remove_config_card(config_id)
+                else:
+                    self.config_dic[config_id].update_size()
+
+            if not run_job(self, platform_dependence.new_krita_config, name,
+                           exclusive=(config_job_key(name),), shared=(STORE_JOB_KEY, RESOURCES_JOB_KEY),
+                           on_done=on_done):
+                self.remove_config_card(config_id)
+                return False, json_manage.language_manager.get_static()['error-busy']
         return is_add
 
+    def remove_config_card(self, config_id):
+        """从界面移除配置卡片并重新排列"""
+        config = self.config_dic.pop(config_id, None)
+        if config is None:
+            return
+        config.destroy()
+        self.frame.update_idletasks()
+        self.on_frame_configure(None)
+        self.arrange_data_cards()
+
     def delete_selected_configs(self):
         """删除所有选中的配置项"""
         # 找出所有选中的配置ID
@@ -418,19 +519,20 @@ class ConfigList(ttk.Frame):
         if not selected_ids:
             return  # 如果没有选中的配置，直接返回
 
-        # 删除选中的配置项
-        for config_id in selected_ids:
-            config = self.config_dic[config_id]
-            if platform_dependence.del_krita_config(config.name):
-                self.config_dic.pop(config_id)
-                config.destroy()  # 从界面移除
+        # 删除选中的配置项，全部在同一个后台操作中完成
+        names = [self.config_dic[config_id].name for config_id in selected_ids]
 
-        # 刷新布局
-        self.frame.update_idletasks()
-        self.on_frame_configure(None)
+        def delete_configs(progress):
+            return [platform_dependence.del_krita_config(name, progress) for name in names]
 
-        # 重新排列卡片
-        self.arrange_data_cards()
+        def on_done(results):
+            for config_id, is_del in zip(selected_ids, results or []):
+                if is_del:
+                    self.remove_config_card(config_id)  # 从界面移除
+
+        # 删除会清理仓库中不再引用的内容，与其他读写仓库的操作冲突
+        run_job(self, delete_configs, exclusive=[config_job_key(name) for name in names] + [STORE_JOB_KEY],
+                on_done=on_done)
 
     def _update_all_cards(self):
         for c in self.config_dic.values():
@@ -614,6 +716,228 @@ class AddConfigDialog(tk.Toplevel):
         self.error_label.config(text=message)
 
 
+class BundleSelectDialog(tk.Toplevel):
+    """从多配置文件导入时选择要导入的配置，默认全选"""
+
+    def __init__(self, parent, names):
+        super().__init__(parent)
+        self.transient(parent)
+        self.title(json_manage.language_manager.get_static()['title-bundle'])
+        self.resizable(False, False)
+
+        self.frame = ttk.Frame(self, padding=(PAD_X * 2, PAD_Y * 2))
+        self.frame.pack(fill='both', expand=True)
+
+        # 存储结果：选中的配置名称列表，取消时为None
+        self.result = None
+
+        self.name_vars = {}
+        for name in names:
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(self.frame, text=name, variable=var).pack(anchor='w', padx=PAD_X, pady=(0, PAD_Y // 2))
+            self.name_vars[name] = var
+
+        button_frame = ttk.Frame(self.frame)
+        button_frame.pack(fill='x', padx=PAD_X, pady=(PAD_Y, 0))
+
+        ttk.Button(
+            button_frame,
+            textvariable=language_var_dic['cancel'],
+            command=self.cancel_clicked
+        ).pack(side='left', padx=(0, PAD_X))
+
+        ttk.Button(
+            button_frame,
+            textvariable=language_var_dic['ok'],
+            style='Accent.TButton',
+            command=self.ok_clicked
+        ).pack(side='right')
+
+        self.bind("<Return>", lambda e: self.ok_clicked())
+
+        self.update_idletasks()
+        move_window_center(self)
+
+        # 设置为模态对话框
+        self.grab_set()
+        self.wait_window(self)
+
+    def ok_clicked(self):
+        self.result = [name for name, var in self.name_vars.items() if var.get()]
+        self.destroy()
+
+    def cancel_clicked(self):
+        self.result = None
+        self.destroy()
+
+
+class ExportBaseDialog(tk.Toplevel):
+    """导出单个配置时选择完整导出或相对于某个基础配置的增量导出"""
+
+    def __init__(self, parent, names):
+        super().__init__(parent)
+        self.transient(parent)
+        self.title(json_manage.language_manager.get_static()['title-delta-base'])
+        self.resizable(False, False)
+
+        self.frame = ttk.Frame(self, padding=(PAD_X * 2, PAD_Y * 2))
+        self.frame.pack(fill='both', expand=True)
+
+        # 存储结果：空字符串表示完整导出，取消时为None
+        self.result = None
+        self.full_export = json_manage.language_manager.get_static()['full-export']
+
+        ttk.Label(self.frame, text=json_manage.language_manager.get_static()['delta-base-tips'],
+                  wraplength=400).pack(anchor='w', padx=PAD_X, pady=PAD_Y)
+
+        self.base_var = tk.StringVar(value=self.full_export)
+        ttk.Combobox(self.frame, textvariable=self.base_var, values=[self.full_export] + list(names),
+                     state='readonly').pack(fill='x', padx=PAD_X, pady=(0, PAD_Y * 2))
+
+        button_frame = ttk.Frame(self.frame)
+        button_frame.pack(fill='x', padx=PAD_X, pady=(PAD_Y, 0))
+
+        ttk.Button(
+            button_frame,
+            textvariable=language_var_dic['cancel'],
+            command=self.cancel_clicked
+        ).pack(side='left', padx=(0, PAD_X))
+
+        ttk.Button(
+            button_frame,
+            textvariable=language_var_dic['ok'],
+            style='Accent.TButton',
+            command=self.ok_clicked
+        ).pack(side='right')
+
+        self.bind("<Return>", lambda e: self.ok_clicked())
+
+        self.update_idletasks()
+        move_window_center(self)
+
+        # 设置为模态对话框
+        self.grab_set()
+        self.wait_window(self)
+
+    def ok_clicked(self):
+        base = self.base_var.get()
+        self.result = '' if base == self.full_export else base
+        self.destroy()
+
+    def cancel_clicked(self):
+        self.result = None
+        self.destroy()
+
+
+class ProgressWindow(tk.Toplevel):
+    """后台操作的进度窗口，显示阶段、进度、速度和剩余时间，可以取消；操作结束后由run_job关闭"""
+
+    def __init__(self, parent, progress):
+        super().__init__(parent)
+        self.transient(parent)
+        self.title(json_manage.language_manager.get_static()['title'])
+        self.resizable(False, False)
+        # 关闭窗口等同于取消，操作停止后窗口才会关闭
+        self.protocol("WM_DELETE_WINDOW", self.cancel_clicked)
+
+        self.frame = ttk.Frame(self, padding=(PAD_X * 2, PAD_Y * 2))
+        self.frame.pack(fill='both', expand=True)
+
+        self.progress = progress
+        self.refresh_id = None
+
+        self.stage_label = ttk.Label(self.frame, width=50)
+        self.stage_label.pack(anchor='w', padx=PAD_X, pady=(0, PAD_Y))
+
+        self.progress_bar = ttk.Progressbar(self.frame, length=400, maximum=PROGRESS_BAR_MAXIMUM)
+        self.progress_bar.pack(fill='x', padx=PAD_X)
+
+        self.detail_label = ttk.Label(self.frame)
+        self.detail_label.pack(anchor='w', padx=PAD_X, pady=PAD_Y)
+
+        self.cancel_button = ttk.Button(
+            self.frame,
+            textvariable=language_var_dic['cancel'],
+            command=self.cancel_clicked
+        )
+        self.cancel_button.pack(side='right', padx=PAD_X)
+
+        self.refresh()
+
+        self.update_idletasks()
+        move_window_center(self)
+
+    def refresh(self):
+        static = json_manage.language_manager.get_static()
+        snapshot = self.progress.snapshot()
+        if self.progress.cancelled:
+            self.stage_label.configure(text=static['progress-cancelling'])
+        else:
+            self.stage_label.configure(text=static.get(snapshot['stage'] or '', ''))
+
+        # 按字节显示进度，没有总量时改为不确定模式
+        if snapshot['total_bytes']:
+            fraction = snapshot['done_bytes'] / snapshot['total_bytes']
+        elif snapshot['total_files']:
+            fraction = snapshot['done_files'] / snapshot['total_files']
+        else:
+            fraction = None
+        if fraction is None:
+            if str(self.progress_bar.cget('mode')) != 'indeterminate':
+                self.progress_bar.configure(mode='indeterminate')
+                self.progress_bar.start()
+            self.detail_label.configure(text='')
+        else:
+            if str(self.progress_bar.cget('mode')) != 'determinate':
+                self.progress_bar.stop()
+                self.progress_bar.configure(mode='determinate')
+            self.progress_bar.configure(value=min(fraction, 1) * PROGRESS_BAR_MAXIMUM)
+            self.detail_label.configure(text=static['progress-detail']
+                                        .replace('{$done}', str(snapshot['done_files']))
+                                        .replace('{$total}', str(snapshot['total_files']))
+                                        .replace('{$speed}', format_size(snapshot['throughput']))
+                                        .replace('{$eta}', format_duration(snapshot['eta'])))
+        self.refresh_id = self.after(PROGRESS_REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        # 窗口销毁后不再刷新，否则已排队的refresh会访问已销毁的控件
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        super().destroy()
+
+    def cancel_clicked(self):
+        self.progress.cancel()
+        self.cancel_button.configure(state='disabled')
+
+
+def run_job(parent, func, *args, exclusive=(), shared=(), on_done=None):
+    """
+    在后台线程中执行长时间操作并显示进度窗口，结束后在界面线程中以操作的返回值调用on_done
+    操作需要接受progress关键字参数；冲突键见STORE_JOB_KEY等
+    :return: 是否已开始执行，与正在执行的操作冲突时提示用户并返回False
+    """
+    root = parent.winfo_toplevel()
+    progress = task_manage.Progress()
+    window = None
+
+    def _on_done(result):
+        if window is not None:
+            window.destroy()
+        if on_done is not None:
+            on_done(result)
+
+    try:
+        root.job_executor.submit(func, *args, exclusive=exclusive, shared=shared, progress=progress, on_done=_on_done)
+    except task_manage.Busy:
+        messagebox.showerror(title=json_manage.language_manager.get_static()['error'],
+                             message=json_manage.language_manager.get_static()['error-busy'])
+        return False
+    # 完成回调经由队列在之后的界面循环中执行，此时窗口一定已经创建
+    window = ProgressWindow(root, progress)
+    return True
+
+
 class ToolBar(ttk.Frame):
     """底部工具栏 - 添加多选开关和应用验证"""
 
@@ -690,6 +1014,14 @@ class ToolBar(ttk.Frame):
         # 启动后台线程检查Krita状态
         self.update_krita_status()
 
+        # 后台限速校验已保存的配置
+        if json_manage.settings_manager.get_setting('background-verify'):
+            self.start_background_verify()
+
+        # 空闲时分步回收配置仓库，每步只占用界面线程几毫秒
+        if json_manage.settings_manager.get_setting('auto-gc'):
+            self.after(GC_START_DELAY_MS, self.collect_garbage_step)
+
     def on_multi_select_changed(self):
         """多选开关状态改变时的回调函数"""
         if not self.config_list:
@@ -701,12 +1033,48 @@ class ToolBar(ttk.Frame):
 
     def update_krita_status(self):
         """在后台线程中更新Krita状态"""
-        platform_dependence.set_krita_is_on_callback(lambda: self.update_status_ui(True))
-        platform_dependence.set_krita_is_off_callback(lambda: self.update_status_ui(False))
-        platform_dependence.set_krita_is_unk_callback(lambda: self.update_status_ui(None))
+        # 状态只在变化时送达，且已经在界面线程中
+        platform_dependence.subscribe_krita_status(lambda is_running, timestamp: self.update_status_ui(is_running))
 
         platform_dependence.update_krita_status()
+        # 回到本程序时（如刚启动或关闭了Krita）立即查询，不等待空闲时较长的查询间隔
+        self.winfo_toplevel().bind('<FocusIn>', lambda e: platform_dependence.wake_krita_monitor(), add='+')
+
+
+    def collect_garbage_step(self):
+        """执行一步垃圾回收，未完成时稍后继续；有读写仓库的后台操作时跳过这一步"""
+        executor = self.winfo_toplevel().job_executor
+        done = False
+        if executor.try_acquire(exclusive=(STORE_JOB_KEY,)):
+            try:
+                done, _ = platform_dependence.collect_garbage(GC_STEP_BUDGET)
+            finally:
+                executor.release(exclusive=(STORE_JOB_KEY,))
+        if not done:
+            self.after(GC_STEP_INTERVAL_MS, self.collect_garbage_step)
+
+    def start_background_verify(self):
+        """以共享仓库的后台任务限速校验全部配置，期间删除和回收仓库内容的操作不会执行；仓库正被独占时稍后重试"""
+        rate = json_manage.settings_manager.get_setting('verify-rate-mb') * 1024 * 1024
+        try:
+            self.winfo_toplevel().job_executor.submit(
+                platform_dependence.verify_krita_configs, None, rate,
+                shared=(STORE_JOB_KEY,), progress=task_manage.Progress(), on_done=self.show_verify_report
+            )
+        except task_manage.Busy:
+            self.after(VERIFY_RETRY_MS, self.start_background_verify)
 
+    def show_verify_report(self, report):
+        """显示后台校验发现的问题，校验失败或被取消时report为None"""
+        if report is None:
+            return
+        for name, result in report.items():
+            if result['missing'] or result['corrupted']:
+                self.show_error(json_manage.language_manager.get_static().get('error-verify-failed')
+                                .replace('{$name}', name)
+                                .replace('{$missing}', str(len(result['missing'])))
+                                .replace('{$corrupted}', str(len(result['corrupted']))))
+                return
 
     def update_status_ui(self, is_running):
         """更新Krita状态UI"""
@@ -837,17 +1205,17 @@ class ToolBar(ttk.Frame):
             self._create_ask_window(text, ok_callback)
 
     def _use(self, config, reset=False):
-        if reset:
-            is_use = platform_dependence.reset_krita()
+        def on_done(is_use):
             if is_use:
                 self.show_success(
                     json_manage.language_manager.get_static().get('apply-done').replace('{$name}', config.name))
 
+        if reset:
+            run_job(self, platform_dependence.reset_krita, exclusive=(RESOURCES_JOB_KEY,), on_done=on_done)
+
         else:
-            is_use = platform_dependence.use_krita_config(config.name)
-            if is_use:
-                self.show_success(
-                    json_manage.language_manager.get_static().get('apply-done').replace('{$name}', config.name))
+            run_job(self, platform_dependence.use_krita_config, config.name, exclusive=(RESOURCES_JOB_KEY,),
+                    shared=(config_job_key(config.name), STORE_JOB_KEY), on_done=on_done)
 
     def show_error(self, message: str):
         """显示错误提示消息，5秒后消失"""
@@ -961,6 +1329,10 @@ class TopToolBar(ttk.Frame):
         self.tool_bar = tool_bar
 
     def output_on_click(self):
+        # 选中多个配置时导出到同一个文件
+        if self.tool_bar.config_list and len(self.tool_bar.config_list.get_selected_configs()) > 1:
+            self.output_bundle()
+            return
         if self.tool_bar.check_selected_items():
             selected_configs = self.tool_bar.config_list.get_selected_configs()
             name = next(iter(selected_configs.values())).name
@@ -968,17 +1340,78 @@ class TopToolBar(ttk.Frame):
                 self.tool_bar.show_error(json_manage.language_manager.get_static().get('error-output-reset')
                                          .replace('{$name}', name))
                 return
+            # 有其他配置时可以选择只导出相对于其中之一的变化部分
+            base = None
+            other_names = [i for i in json_manage.config_manager.get_all_configs().keys() if i != name]
+            if other_names:
+                base = ExportBaseDialog(self.root, other_names).result
+                if base is None:
+                    return
             path = filedialog.asksaveasfilename(defaultextension='.zip', filetypes=(('zip', '*.zip'),), initialfile=name)
             if path:
-                ask_window = AskWindow(self.root, text_variable=language_var_dic['on-output'], button_dis=True)
-                ask_window.update_idletasks()
-                platform_dependence.output_krita_config(name, path)
-                ask_window.destroy()
+                keys = [config_job_key(name)] + ([config_job_key(base)] if base else [])
+                run_job(self, platform_dependence.output_krita_config, name, path, base or None,
+                        shared=keys + [STORE_JOB_KEY])
+
+    def output_bundle(self):
+        """将选中的多个配置导出到同一个文件"""
+        selected_configs = self.tool_bar.config_list.get_selected_configs()
+        if 0 in selected_configs:
+            self.tool_bar.show_error(json_manage.language_manager.get_static().get('error-output-reset')
+                                     .replace('{$name}', selected_configs[0].name))
+            return
+        path = filedialog.asksaveasfilename(defaultextension='.zip', filetypes=(('zip', '*.zip'),),
+                                            initialfile='krita-configs')
+        if path:
+            names = [config.name for config in selected_configs.values()]
+            run_job(self, platform_dependence.output_krita_bundle, names, path,
+                    shared=[config_job_key(name) for name in names] + [STORE_JOB_KEY])
+
+    def input_bundle(self, path, bundle):
+        """从多配置文件中选择并导入配置，与现有配置重名的逐个询问新名称"""
+        platform = platform_dependence.get_platform_name()
+        available = [name for _, config_platform, name in bundle if config_platform == platform]
+        if not available:
+            if bundle:
+                _, config_platform, config_name = bundle[0]
+                self.tool_bar.show_error(json_manage.language_manager.get_static().get('error-platform-conflict')
+                                         .replace('{$name}', config_name)
+                                         .replace('{#config-platform}', config_platform)
+                                         .replace('{#platform}', platform))
+            return
+
+        selected = BundleSelectDialog(self.root, available).result
+        if not selected:
+            return
+        existing_names = list(json_manage.config_manager.get_all_configs().keys())
+        names = {}
+        for config_name in selected:
+            new_name = config_name
+            if new_name in existing_names:
+                default_name = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+                new_name = AddConfigDialog(self.root, default_name, existing_names,
+                                           text=json_manage.language_manager.get_static().get('input-name_disagreement')
+                                           .replace('{$name}', config_name)).result
+                if not new_name:
+                    continue
+            existing_names.append(new_name)
+            names[config_name] = new_name
+        if names:
+            self.config_list.input_bundle(path, names)
 
     def input_on_click(self):
         path = filedialog.askopenfilename(defaultextension='.zip', filetypes=(('zip', '*.zip'),))
         if path:
-            config_path, config_platform, config_name, file_path = platform_dependence.extract_krita_config(path)
+            bundle = platform_dependence.read_krita_bundle_info(path)
+            if bundle is not None:
+                self.input_bundle(path, bundle)
+                return
+
+            # 只读取归档中的配置信息，检查通过后才解压内容
+            info = platform_dependence.read_krita_config_info(path)
+            if info is None:
+                return
+            config_path, config_platform, config_name = info
 
             if config_platform != platform_dependence.get_platform_name():
                 ask_window = AskWindow(self.winfo_toplevel(),
@@ -997,7 +1430,7 @@ class TopToolBar(ttk.Frame):
                                            .replace('{$name}', config_name))
                 config_name = new_name.result
             if config_name:
-                self.config_list.input_config(file_path, config_name)
+                self.config_list.input_config(path, config_name)
 
 class SettingWindow(tk.Toplevel):
     def __init__(self, parent):
@@ -1,11 +1,15 @@
-import json
+import functools
 import sys
 import pywinstyles
 import sv_ttk
-import subprocess
 import threading
+import time
 import os
 import json_manage
+import archive
+import config_store
+import process_probe
+import task_manage
 import shutil
 import tkinter.messagebox as messagebox
 
@@ -45,10 +49,32 @@ def apply_theme_to_titlebar(master):
     _apply_theme_to_titlebar(master)
 
 
+def subscribe_krita_status(callback):
+    """
+    订阅Krita状态变化，回调在界面线程中执行，相同的状态不会重复回调；已有状态时会先收到一次当前状态
+    Subscribe to Krita status changes; callbacks run on the UI thread, repeated states are not delivered again,
+    and the current status is delivered first if there is one
+
+    :param callback: 回调函数，参数为(状态, 变化时间)，状态True表示正在运行, False表示未运行, None表示检查失败 |
+                     Callback receiving (status, time of change), status True if running, False if not, None if check failed
+    """
+    _krita_status.subscribe(callback)
+
+
+def unsubscribe_krita_status(callback):
+    """
+    取消订阅Krita状态变化
+    Unsubscribe from Krita status changes
+
+    :param callback: 订阅时的回调函数 | Callback function passed when subscribing
+    """
+    _krita_status.unsubscribe(callback)
+
+
 def set_krita_is_on_callback(callback):
     """
-    设置Krita启动时的回调函数
-    Set callback function when Krita starts
+    设置Krita启动时的回调函数，兼容旧接口，新代码请使用subscribe_krita_status
+    Set callback function when Krita starts, kept for compatibility, new code should use subscribe_krita_status
 
     :param callback: 回调函数 | Callback function
     """
@@ -57,8 +83,8 @@ def set_krita_is_on_callback(callback):
 
 def set_krita_is_off_callback(callback):
     """
-    设置Krita关闭时的回调函数
-    Set callback function when Krita stops
+    设置Krita关闭时的回调函数，兼容旧接口，新代码请使用subscribe_krita_status
+    Set callback function when Krita stops, kept for compatibility, new code should use subscribe_krita_status
 
     :param callback: 回调函数 | Callback function
     """
@@ -67,8 +93,8 @@ def set_krita_is_off_callback(callback):
 
 def set_krita_is_unk_callback(callback):
     """
-    设置Krita状态未知时的回调函数
-    Set callback function when Krita status is unknown
+    设置Krita状态未知时的回调函数，兼容旧接口，新代码请使用subscribe_krita_status
+    Set callback function when Krita status is unknown, kept for compatibility, new code should use subscribe_krita_status
 
     :param callback: 回调函数 | Callback function
     """
@@ -77,14 +103,25 @@ def set_krita_is_unk_callback(callback):
 
 def check_krita():
     """
-    检查Krita是否正在运行
-    Check if Krita is running
+    检查Krita是否正在运行，返回后台状态更新缓存的结果，缓存过期时才重新查询
+    Check if Krita is running, returning the result cached by the background status updates and only probing again when it is stale
 
     :return: True表示正在运行, False表示未运行, None表示检查失败
              True if running, False if not, None if check failed
     :rtype: bool or None
     """
-    return _check_krita()
+    return _get_krita_status()
+
+
+def get_krita_probe_stats():
+    """
+    获取Krita进程查询的方式和耗时统计
+    Get the process probe in use and its cost statistics
+
+    :return: {'probe', 'count', 'last', 'mean', 'max', 'age'}，耗时和缓存时间单位为秒 | Costs and cache age in seconds
+    :rtype: dict
+    """
+    return _krita_monitor.stats()
 
 
 def update_krita_status():
@@ -95,16 +132,25 @@ def update_krita_status():
     _update_krita_status()
 
 
-def new_krita_config(name):
+def wake_krita_monitor():
+    """
+    让Krita状态的后台更新立即查询一次，不等待空闲时逐渐拉长的间隔
+    Make the background Krita status updates probe immediately instead of waiting out the idle backoff interval
+    """
+    _wake_krita_monitor()
+
+
+def new_krita_config(name, progress=None):
     """
     创建新的Krita配置
     Create a new Krita configuration
 
     :param name: 配置名称 | Configuration name
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
     :return: (是否成功, 错误信息) | (Success status, Error message)
     :rtype: (bool, str or None)
     """
-    return _new_krita_config(name)
+    return _new_krita_config(name, progress)
 
 
 def get_config_path(name):
@@ -119,6 +165,18 @@ def get_config_path(name):
     return _get_config_path(name)
 
 
+def get_config_size(name):
+    """
+    获取配置包含的文件数和总大小，只读取清单，不遍历配置中的文件
+    Get the file count and total size of a configuration from its manifest, without walking the stored files
+
+    :param name: 配置名称 | Configuration name
+    :return: (文件数, 总字节数)，没有清单时返回None | (File count, Total bytes), None if there is no manifest
+    :rtype: (int, int) or None
+    """
+    return _get_config_size(name)
+
+
 def check_configuration_path(name):
     """
     检查配置中的资源路径与目前程序设置的路径是否相同
@@ -131,73 +189,196 @@ def check_configuration_path(name):
     return _check_configuration_path(name)
 
 
-def reset_krita():
+def estimate_new_krita_config():
+    """
+    估算新建配置需要读取的数据量和仓库所在磁盘的可用空间
+    Estimate the amount of data a new configuration snapshot reads and the free space where the store lives
+
+    :return: {'bytes': 总字节数, 'files': 文件数, 'free': 可用字节数} | Total bytes, file count and free bytes
+    :rtype: dict
+    """
+    return _estimate_new_krita_config()
+
+
+def estimate_use_krita_config(name):
+    """
+    估算应用配置需要写入的数据量和资源目录所在磁盘的可用空间
+    Estimate the amount of data applying a configuration writes and the free space at the resources path
+
+    :param name: 配置名称 | Configuration name
+    :return: {'bytes': 总字节数, 'files': 文件数, 'free': 可用字节数} | Total bytes, file count and free bytes
+    :rtype: dict
+    """
+    return _estimate_use_krita_config(name)
+
+
+def estimate_output_krita_config(name, path):
+    """
+    估算导出配置的数据量和目标位置所在磁盘的可用空间
+    Estimate the amount of data exporting a configuration writes and the free space at the destination
+
+    :param name: 配置名称 | Configuration name
+    :param path: 导出文件路径 | Export file path
+    :return: {'bytes': 总字节数, 'files': 文件数, 'free': 可用字节数} | Total bytes, file count and free bytes
+    :rtype: dict
+    """
+    return _estimate_output_krita_config(name, path)
+
+
+def reset_krita(progress=None):
     """
     重置Krita配置到初始状态
     Reset Krita configuration to initial state
 
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
     :return: 是否成功 | Whether succeeded
     :rtype: bool
     """
-    return _reset_krita()
+    return _reset_krita(progress)
 
 
-def use_krita_config(name):
+def use_krita_config(name, progress=None):
     """
     应用指定的Krita配置
     Apply specified Krita configuration
 
     :param name: 配置名称 | Configuration name
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
     :return: 是否成功 | Whether succeeded
     :rtype: bool
     """
-    return _use_krita_config(name)
+    return _use_krita_config(name, progress)
 
 
-def del_krita_config(name):
+def del_krita_config(name, progress=None):
     """
     删除指定的Krita配置
     Delete specified Krita configuration
 
     :param name: 配置名称 | Configuration name
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
     :return: 是否成功 | Whether succeeded
     :rtype: bool
     """
-    return _del_krita_config(name)
+    return _del_krita_config(name, progress)
+
 
+def verify_krita_configs(names=None, rate=None, progress=None):
+    """
+    重新计算配置中全部文件的哈希并与记录比较
+    Re-hash every file of the configurations and compare with the recorded checksums
+
+    :param names: 要校验的配置名称列表，None表示全部已迁移进仓库的配置 | Configuration names to verify, None for all configurations already in the store
+    :param rate: 读取速度上限(字节/秒)，None表示不限速 | Read rate limit in bytes per second, None for unlimited
+    :param progress: 可选的进度，用于取消操作 | Optional progress used for cancellation
+    :return: {配置名: {'missing': [...], 'corrupted': [...], 'extra': [...]}} | Per-configuration report
+    :rtype: dict
+    """
+    return _verify_krita_configs(names, rate, progress)
+
+
+def collect_garbage(budget=None):
+    """
+    回收配置仓库中不再被引用的内容和遗留的临时文件；指定时间预算时每次调用只执行一部分，需要重复调用直到完成
+    Reclaim unreferenced store content and leftover temporary files; with a time budget each call does only part of the work and must be repeated until done
 
-def output_krita_config(name, path):
+    :param budget: 本次调用的时间预算(秒)，None表示一次执行完 | Time budget in seconds for this call, None to run to completion
+    :return: (是否完成, 已回收字节数) | (Whether finished, Bytes reclaimed so far)
+    :rtype: (bool, int)
     """
-    导出Krita配置到ZIP文件
-    Export Krita configuration to ZIP file
+    return _collect_garbage(budget)
+
+
+def output_krita_config(name, path, base=None, progress=None):
+    """
+    导出Krita配置到ZIP文件，指定基础配置时只导出相对于它的变化部分
+    Export Krita configuration to ZIP file, only the changes relative to the base configuration if one is given
 
     :param name: 配置名称 | Configuration name
     :param path: 导出文件路径 | Export file path
+    :param base: 可选的基础配置名称 | Optional base configuration name
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
+    :return: 是否成功 | Whether succeeded
+    :rtype: bool
     """
-    _output_krita_config(name, path)
+    return _output_krita_config(name, path, base, progress)
 
 
-def extract_krita_config(path):
+def output_krita_bundle(names, path, progress=None):
     """
-    从ZIP文件提取Krita配置
-    Extract Krita configuration from ZIP file
+    将多个Krita配置导出到同一个ZIP文件，配置之间相同的文件只保存一份
+    Export several Krita configurations into one ZIP file, storing files shared between them only once
+
+    :param names: 配置名称列表 | Configuration names
+    :param path: 导出文件路径 | Export file path
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
+    :return: 是否成功 | Whether succeeded
+    :rtype: bool
+    """
+    return _output_krita_bundle(names, path, progress)
+
+
+def read_krita_bundle_info(path):
+    """
+    读取多配置ZIP文件中的配置列表，不解压配置内容
+    Read the list of configurations in a multi-configuration ZIP file without extracting its contents
 
     :param path: ZIP文件路径 | ZIP file path
-    :return: (资源路径, 平台, 名称, 临时路径) | (Resources path, Platform, Name, Temp path)
-    :rtype: (str, str, str, str)
+    :return: [(资源路径, 平台, 名称)]，不是多配置文件时返回None，读取失败时返回空列表 |
+             [(Resources path, Platform, Name)], None if it is not a multi-configuration file, empty on failure
+    :rtype: list or None
     """
-    return _extract_krita_config(path)
+    return _read_krita_bundle_info(path)
 
 
-def input_krita_config(path, new_name=None):
+def input_krita_bundle(path, names, progress=None):
     """
-    导入Krita配置
-    Import Krita configuration
+    从多配置ZIP文件中导入选中的配置
+    Import the selected configurations from a multi-configuration ZIP file
 
-    :param path: 配置文件路径 | Configuration file path
+    :param path: ZIP文件路径 | ZIP file path
+    :param names: {文件中的配置名称: 导入后的名称} | {Name in the file: Name after import}
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
+    :return: 成功导入的配置名称列表 | Names of the imported configurations
+    :rtype: list
+    """
+    return _input_krita_bundle(path, names, progress)
+
+
+def read_krita_config_info(path):
+    """
+    只读取ZIP文件中的配置信息，不解压配置内容，用于导入前的检查
+    Read only the configuration info from a ZIP file without extracting its contents, for checks before importing
+
+    :param path: ZIP文件路径 | ZIP file path
+    :return: (资源路径, 平台, 名称)，读取失败时返回None | (Resources path, Platform, Name), None on failure
+    :rtype: (str, str, str) or None
+    """
+    return _read_krita_config_info(path)
+
+
+def input_krita_config(path, new_name=None, progress=None):
+    """
+    从ZIP文件导入Krita配置，内容直接解压进配置仓库
+    Import Krita configuration from a ZIP file, extracting its contents straight into the configuration store
+
+    :param path: ZIP文件路径 | ZIP file path
     :param new_name: 可选的新名称 | Optional new name
+    :param progress: 可选的进度，用于显示进度和取消操作 | Optional progress used for display and cancellation
+    :return: 是否成功 | Whether succeeded
+    :rtype: bool
+    """
+    return _input_krita_config(path, new_name, progress)
+
+
+def set_ui_dispatcher(dispatcher):
+    """
+    设置界面调用分发器，操作在工作线程中执行时，错误提示等对话框经由它在界面线程中显示
+    Set the UI dispatcher; when operations run on worker threads, dialogs such as error messages are shown on the UI thread through it
+
+    :param dispatcher: task_manage.UiDispatcher对象 | task_manage.UiDispatcher object
     """
-    _input_krita_config(path, new_name)
+    _set_ui_dispatcher(dispatcher)
 
 
 def get_platform_name():
@@ -243,65 +424,92 @@ def _apply_theme_to_titlebar(master):
     elif version.major == 10:
         pywinstyles.apply_style(master, "dark" if sv_ttk.get_theme() == "dark" else "normal")
 
-_last_krita_status = None
-_krita_is_on_callback = None
-_krita_is_off_callback = None
-_krita_is_unk_callback = None
+# Krita状态的广播，设置界面分发器后回调在界面线程中执行
+_krita_status = task_manage.StatusBus()
+# 旧接口设置的回调：状态 -> 订阅的包装函数，再次设置时替换
+_krita_status_callbacks = {}
+
+def _set_krita_status_callback(status, callback):
+    previous = _krita_status_callbacks.pop(status, None)
+    if previous:
+        _krita_status.unsubscribe(previous)
+    if callback is None:
+        return
+
+    def _callback(new_status, timestamp):
+        if new_status is status:
+            callback()
+    _krita_status_callbacks[status] = _callback
+    _krita_status.subscribe(_callback)
 
 def _set_krita_is_on_callback(callback):
-    global _krita_is_on_callback
-    _krita_is_on_callback = callback
+    _set_krita_status_callback(True, callback)
 
 def _set_krita_is_off_callback(callback):
-    global _krita_is_off_callback
-    _krita_is_off_callback = callback
+    _set_krita_status_callback(False, callback)
 
 def _set_krita_is_unk_callback(callback):
-    global _krita_is_unk_callback
-    _krita_is_unk_callback = callback
+    _set_krita_status_callback(None, callback)
+
+def _on_krita_status_changed(status, timestamp):
+    names = {True: '运行中', False: '未运行', None: '未知'}
+    print(f"[INFO] Krita状态: {names[status]} ({time.strftime('%H:%M:%S', time.localtime(timestamp))})")
+
+_krita_status.subscribe(_on_krita_status_changed)
+
+# 在本进程内枚举进程（psutil、Toolhelp32），都不可用时才启动tasklist
+_krita_monitor = process_probe.ProcessMonitor('krita.exe')
+# 缓存的状态超过此时间（秒）后读取时重新查询；后台更新在空闲时间隔较长，在Krita运行时阻塞等待其退出
+_KRITA_STATUS_MAX_AGE = 2.0
+# 后台更新每隔多少次查询输出一次耗时统计
+_KRITA_PROBE_LOG_INTERVAL = 100
+# Krita未运行时查询间隔的下限、上限（秒）和状态不变时每次增大的倍数
+_KRITA_IDLE_MIN_INTERVAL = 0.5
+_KRITA_IDLE_MAX_INTERVAL = 3.0
+_KRITA_IDLE_BACKOFF = 1.5
+# 等待Krita退出的最长时间（秒），到时重新查询一次，避免进程ID被复用等情况下一直等待
+_KRITA_EXIT_WAIT_TIMEOUT = 60.0
+_krita_wake = threading.Event()
 
 def _check_krita():
-    try:
-        # 检查krita.exe进程
-        output = subprocess.check_output(
-            ['tasklist', '/FI', 'IMAGENAME eq krita.exe'],
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        is_run = b"krita.exe" in output
-
-        return is_run
-    except:
-        # 出错时保持灰色状态
-        # noinspection PyTypeChecker
-        return None
+    # 出错时返回None，保持灰色状态
+    return _krita_monitor.probe()
+
+def _get_krita_status():
+    return _krita_monitor.cached(_KRITA_STATUS_MAX_AGE)
+
+def _wake_krita_monitor():
+    _krita_wake.set()
 
 def _update_krita_status():
     """后台更新Krita状态"""
     # noinspection PyBroadExceptio
     def _check():
 
-        global _last_krita_status
-        global _krita_is_on_callback
-        global _krita_is_off_callback
-        global _krita_is_unk_callback
-
+        interval = _KRITA_IDLE_MIN_INTERVAL
         while True:
             is_running = _check_krita()
-            if is_running is False and _last_krita_status != is_running:
-                _last_krita_status = is_running
-                if _krita_is_off_callback:
-                    _krita_is_off_callback()
-
-            elif is_running is True and _last_krita_status != is_running:
-                _last_krita_status = is_running
-                if _krita_is_on_callback:
-                    _krita_is_on_callback()
-
-            elif is_running is None and _last_krita_status != is_running:
-                if _krita_is_unk_callback:
-                    _krita_is_unk_callback()
-
-            threading.Event().wait(0.5)
+            stats = _krita_monitor.stats()
+            if stats['count'] % _KRITA_PROBE_LOG_INTERVAL == 1:
+                print(f"[INFO] Krita进程查询: {stats['probe']}, {stats['count']}次, "
+                      f"平均{stats['mean'] * 1000:.2f}ms, 最大{stats['max'] * 1000:.2f}ms")
+            # 只有状态变化时才会通知订阅者
+            changed = _krita_status.publish(is_running)
+
+            pids = _krita_monitor.pids
+            if is_running and pids:
+                # 运行中：阻塞等待进程退出，退出后立即重新查询（可能还有其他实例）
+                _krita_monitor.wait_exit(pids[0], _KRITA_EXIT_WAIT_TIMEOUT)
+                interval = _KRITA_IDLE_MIN_INTERVAL
+                continue
+
+            # 未运行或状态未知：状态不变时逐渐拉长查询间隔，可以被_wake_krita_monitor提前唤醒
+            if changed:
+                interval = _KRITA_IDLE_MIN_INTERVAL
+            else:
+                interval = min(interval * _KRITA_IDLE_BACKOFF, _KRITA_IDLE_MAX_INTERVAL)
+            _krita_wake.wait(interval)
+            _krita_wake.clear()
 
             # 启动后台线程
     threading.Thread(target=_check, daemon=True).start()
@@ -312,29 +520,214 @@ def _make_no_username_path(path: str):
 def _add_username_path(path: str):
     return path.replace('{$USERDIR}',os.path.join(os.getenv('SYSTEMDRIVE'),os.getenv('HOMEPATH')))
 
-def _new_krita_config(name):
+_ui_dispatcher = None
+
+def _set_ui_dispatcher(dispatcher):
+    global _ui_dispatcher
+    _ui_dispatcher = dispatcher
+    _krita_status.dispatcher = dispatcher
+
+def _on_ui_thread(func, *args, **kwargs):
+    """在界面线程中执行Tk调用并返回结果，没有设置分发器时直接执行"""
+    if _ui_dispatcher is None:
+        return func(*args, **kwargs)
+    return _ui_dispatcher.call(functools.partial(func, *args, **kwargs))
+
+def _show_error(message):
+    _on_ui_thread(messagebox.showerror, title=json_manage.language_manager.get_static().get('error'), message=message)
+
+def _report_error(e):
+    """显示操作中的错误，被用户取消时只记录日志"""
+    if isinstance(e, task_manage.Cancelled):
+        print("[INFO] 操作已取消")
+    else:
+        _show_error(str(e))
 
-    path = os.path.join('.', 'config', name)
+def _set_stage(progress, stage, total_files=0, total_bytes=0):
+    if progress:
+        progress.set_stage(stage, total_files, total_bytes)
+
+_config_store = config_store.ObjectStore(os.path.join(os.getcwd(), 'config', '.objects'))
+
+def _get_manifest_path(name):
+    return os.path.join(os.getcwd(), 'config', name, config_store.MANIFEST_NAME)
+
+def _create_config_dir(name):
+    """
+    创建配置目录；目录已存在时（例如登记丢失但仍有清单的配置）视为名称冲突，不能覆盖，失败时也不能删除
+    :return: 配置目录路径
+    :raise ValueError: 目录已存在
+    """
+    path = os.path.join(os.getcwd(), 'config', name)
+    try:
+        os.makedirs(path)
+    except FileExistsError:
+        raise ValueError(json_manage.language_manager.get_static().get('error-name-conflict')
+                         .replace('{$name}', name)) from None
+    return path
+
+def _apply_store_settings():
+    """将存储相关的设置同步到对象仓库"""
+    compression = json_manage.settings_manager.get_setting('snapshot-compression')
+    if compression and compression not in config_store.COMPRESSORS:
+        print(f"[WARN] 不支持的压缩方式: {compression}，将不压缩保存")
+        compression = None
+    _config_store.compression = compression
+    _config_store.chunking = json_manage.settings_manager.get_setting('chunk-large-files')
+
+def _get_path_filter():
+    """根据设置中的包含/排除规则生成筛选器"""
+    return config_store.PathFilter(json_manage.settings_manager.get_setting('snapshot-include') or [],
+                                   json_manage.settings_manager.get_setting('snapshot-exclude') or [])
+
+def _collect_snapshot_items(src_path, missing_ok=False, excluded=None):
+    """
+    收集需要存入快照的文件和目录，资源目录对应'resources'，本地配置文件对应'config'，被筛选规则排除的项不包括在内
+    :param missing_ok: 资源目录不存在时是否视为空目录，否则抛出FileNotFoundError
+    :param excluded: 列表（可选），资源目录中被筛选规则排除的项追加到其中，见config_store.scan_tree
+    """
+    path_filter = _get_path_filter()
+    if missing_ok and not os.path.isdir(src_path):
+        files, dirs = [], []
+    else:
+        files, dirs = config_store.scan_tree(src_path, 'resources', path_filter, excluded)
+    dirs.append('config')
+    for i in _krita_local_appdata_path:
+        rel = f'config/{os.path.basename(i)}'
+        if os.path.isfile(i) and not path_filter.excludes(rel):
+            files.append((rel, i))
+    return files, dirs
+
+# 同时读取同一配置的后台任务（如应用和导出）共享配置的冲突键，旧版本配置的迁移需要按配置串行，
+# 否则两个任务会同时迁移，其中一个删除原目录时另一个还在遍历
+_migrate_locks = {}
+_migrate_locks_guard = threading.Lock()
+
+def _migrate_lock(name):
+    with _migrate_locks_guard:
+        return _migrate_locks.setdefault(name, threading.Lock())
+
+def _load_manifest(name):
+    """读取配置的清单，旧版本直接复制的配置目录会先迁移进仓库"""
+    path = os.path.join(os.getcwd(), 'config', name)
+    manifest_path = _get_manifest_path(name)
+    with _migrate_lock(name):
+        if not os.path.exists(manifest_path) and os.path.isdir(os.path.join(path, 'resources')):
+            files, dirs = config_store.scan_tree(os.path.join(path, 'resources'), 'resources')
+            if os.path.isdir(os.path.join(path, 'config')):
+                config_files, config_dirs = config_store.scan_tree(os.path.join(path, 'config'), 'config')
+                files += config_files
+                dirs += config_dirs
+            _apply_store_settings()
+            link = json_manage.settings_manager.get_setting('use-hardlinks')
+            config_store.snapshot(_config_store, files, dirs, link=link).save(manifest_path)
+            shutil.rmtree(os.path.join(path, 'resources'))
+            shutil.rmtree(os.path.join(path, 'config'), ignore_errors=True)
+    return config_store.Manifest.load(manifest_path)
+
+def _find_parent_manifest(resources_path):
+    """查找同一资源目录最近一次快照的清单，用于增量快照"""
+    configs = json_manage.config_manager.get_all_configs()
+    for name, config in sorted(configs.items(), key=lambda i: i[1].get('time', ''), reverse=True):
+        if config.get('resources_path') != resources_path:
+            continue
+        try:
+            return _load_manifest(name)
+        except FileNotFoundError:
+            continue
+    return None
+
+def _snapshot_target(rel, resources_path):
+    """将清单中的相对路径映射为应用时的目标路径"""
+    root, _, sub = rel.partition('/')
+    if root == 'resources':
+        return os.path.join(resources_path, *sub.split('/')) if sub else resources_path
+    if root == 'config' and sub:
+        for i in _krita_local_appdata_path:
+            if os.path.basename(i) == sub:
+                return i
+    return None
+
+def _filtered(manifest, resolve):
+    """包装路径映射函数，被筛选规则排除的项映射为None，用于应用和导出"""
+    path_filter = _get_path_filter()
+    dirs = set(manifest.dirs)
+
+    def _resolve(rel):
+        if path_filter.excludes_tree(rel, rel in dirs):
+            return None
+        return resolve(rel)
+    return _resolve
+
+_size_estimator = config_store.SizeEstimator()
+
+def _estimate_new_krita_config():
+    src_path = json_manage.settings_manager.get_setting('krita_resources_path').replace('/', '\\')
+    path_filter = _get_path_filter()
+    size, count = _size_estimator.estimate(src_path, 'resources', path_filter)
+    for i in _krita_local_appdata_path:
+        if os.path.isfile(i) and not path_filter.excludes(f'config/{os.path.basename(i)}'):
+            size += os.path.getsize(i)
+            count += 1
+    return {'bytes': size, 'files': count, 'free': config_store.free_space(_config_store.root)}
+
+def _estimate_manifest(name, dst_path):
+    """根据清单估算，不需要遍历仓库"""
+    manifest = _load_manifest(name)
+    return {'bytes': manifest.total_size(), 'files': len(manifest.files), 'free': config_store.free_space(dst_path)}
+
+def _estimate_use_krita_config(name):
+    return _estimate_manifest(name, _get_config_path(name)[1])
+
+def _estimate_output_krita_config(name, path):
+    return _estimate_manifest(name, os.path.dirname(os.path.abspath(path)))
+
+def _confirm_free_space(estimate):
+    """
+    输出预估结果，预计数据量超过可用空间时询问是否继续
+    去重、增量和压缩会使实际写入量小于预估，因此只提示而不直接阻止
+    """
+    print(f"[INFO] 预估: {estimate['files']}个文件, {estimate['bytes']}字节, 可用空间{estimate['free']}字节")
+    if estimate['bytes'] <= estimate['free']:
+        return True
+    return _on_ui_thread(
+        messagebox.askyesno,
+        title=json_manage.language_manager.get_static().get('warning'),
+        message=json_manage.language_manager.get_static().get('warn-low-space')
+        .replace('{$need}', f"{estimate['bytes'] / 1024 / 1024:.1f}MB")
+        .replace('{$free}', f"{estimate['free'] / 1024 / 1024:.1f}MB"))
+
+def _new_krita_config(name, progress=None):
+
+    path = None
     src_path = json_manage.settings_manager.get_setting('krita_resources_path').replace('/', '\\')
     src_path_no_username = _make_no_username_path(src_path)
 
     try:
-        shutil.copytree(src_path, os.path.join(path, 'resources'))
-        os.makedirs(os.path.join(path, 'config'))
-
-        for i in _krita_local_appdata_path:
-            try:
-                shutil.copyfile(i, os.path.join(path, 'config', os.path.basename(i)))
-            except FileNotFoundError:
-                pass
+        _set_stage(progress, 'progress-estimate')
+        estimate = _estimate_new_krita_config()
+        if not _confirm_free_space(estimate):
+            return False, json_manage.language_manager.get_static().get('warn-low-space')
+        _apply_store_settings()
+        _set_stage(progress, 'progress-snapshot', estimate['files'], estimate['bytes'])
+        files, dirs = _collect_snapshot_items(src_path)
+        parent = None
+        if json_manage.settings_manager.get_setting('incremental-snapshot'):
+            parent = _find_parent_manifest(src_path_no_username)
+        # Krita运行时文件可能正在被写入，使用在线快照
+        online = _get_krita_status() is not False
+        manifest = config_store.snapshot(_config_store, files, dirs, parent, online=online, progress=progress)
+        path = _create_config_dir(name)
+        manifest.save(_get_manifest_path(name))
+        print(f"[INFO] 快照复制方式: {_config_store.copier.take_stats()}, "
+              f"磁盘占用: {config_store.footprint(_config_store, manifest)}")
         json_manage.config_manager.new_config(name, src_path_no_username, _get_platform_name())
         return True, None
     except Exception as e:
-        messagebox.showerror(title=json_manage.language_manager.get_static().get('error'), message=str(e))
-        try:
-            shutil.rmtree(path)
-        except FileNotFoundError:
-            pass
+        _report_error(e)
+        # 只删除这次创建的目录
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
         return False, str(e)
 
 def _get_path(name):
@@ -342,6 +735,13 @@ def _get_path(name):
     sre_path = json_manage.config_manager.get_config(name).get('resources_path')
     return [path, sre_path]
 
+def _get_config_size(name):
+    try:
+        manifest = config_store.Manifest.load(_get_manifest_path(name))
+    except (FileNotFoundError, ValueError):
+        return None
+    return len(manifest.files), manifest.total_size()
+
 def _get_config_path(name):
     path, sre_path = _get_path(name)
     return path, _add_username_path(sre_path)
@@ -352,8 +752,10 @@ def _check_configuration_path(name):
         return False
     return True
 
-def _reset_krita():
+def _reset_krita(progress=None):
     try:
+        # 删除不能中途停止，只显示阶段
+        _set_stage(progress, 'progress-reset')
         shutil.rmtree(json_manage.settings_manager.get_setting('krita_resources_path'))
         for i in _krita_local_appdata_path:
             try:
@@ -361,22 +763,53 @@ def _reset_krita():
             except FileNotFoundError:
                 pass
             except Exception as e:
-                messagebox.showerror(title=json_manage.language_manager.get_static().get('error'), message=str(e))
+                _show_error(str(e))
                 return False
     except FileNotFoundError:
         return True
 
     except Exception as e:
-        messagebox.showerror(title=json_manage.language_manager.get_static().get('error'),message=str(e))
+        _report_error(e)
         return False
 
     return True
 
 
-def _use_krita_config(name):
+def _format_throughput(size, seconds):
+    return f"{size}字节, 用时{seconds:.2f}秒, {size / max(seconds, 1e-6) / 1024 / 1024:.1f}MB/s"
+
+def _use_krita_config(name, progress=None):
     path, sre_path = _get_path(name)
     sre_path = _add_username_path(sre_path)
 
+    try:
+        _set_stage(progress, 'progress-estimate')
+        estimate = _estimate_use_krita_config(name)
+        if not _confirm_free_space(estimate):
+            return False
+    except Exception as e:
+        _report_error(e)
+        return False
+
+    if json_manage.settings_manager.get_setting('verify-before-apply'):
+        try:
+            _set_stage(progress, 'progress-verify')
+            message = _verify_error_message(name, _verify_krita_configs([name], progress=progress)[name])
+        except Exception as e:
+            _report_error(e)
+            return False
+        if message:
+            _show_error(message)
+            return False
+
+    _set_stage(progress, 'progress-apply', estimate['files'], estimate['bytes'])
+    # 各方式的取舍见设置apply-mode
+    apply_mode = json_manage.settings_manager.get_setting('apply-mode')
+    if apply_mode == 'staged':
+        return _use_krita_config_staged(name, sre_path, progress)
+    if apply_mode == 'delta':
+        return _use_krita_config_delta(name, sre_path, progress)
+
     try:
         _reset_krita()
         try:
@@ -385,64 +818,398 @@ def _use_krita_config(name):
             pass
 
         try:
-            shutil.copytree(os.path.join(path, 'resources'), sre_path)
+            manifest = _load_manifest(name)
+            config_store.checkout(_config_store, manifest,
+                                  _filtered(manifest, lambda rel: _snapshot_target(rel, sre_path)), progress=progress)
+            print(f"[INFO] 应用复制方式: {_config_store.copier.take_stats()}")
         except Exception as e:
-            messagebox.showerror(title=json_manage.language_manager.get_static().get('error'), message=str(e))
+            # 取消时资源目录中只有部分文件，与复制失败一样需要重新应用
+            _report_error(e)
             return False
 
-
-        for i in _krita_local_appdata_path:
-            try:
-                shutil.copyfile(os.path.join(path, 'config', os.path.basename(i)), i)
-            except FileNotFoundError:
-                pass
-            except Exception as e:
-                messagebox.showerror(title=json_manage.language_manager.get_static().get('error'), message=str(e))
-                return False
-
     except FileNotFoundError:
         pass
 
     except Exception as e:
-        messagebox.showerror(title=json_manage.language_manager.get_static().get('error'),message=str(e))
+        _show_error(str(e))
         return False
     if json_manage.settings_manager.get_setting('krita_resources_path') != sre_path:
         json_manage.settings_manager.set_setting('krita_resources_path', sre_path)
     return True
 
-def _del_krita_config(name):
+def _use_krita_config_delta(name, sre_path, progress=None):
+    """增量应用配置，只修改与配置不同的文件"""
+    try:
+        # 配置的资源目录与当前设置不同时，当前目录仍按原来的方式整体删除
+        if json_manage.settings_manager.get_setting('krita_resources_path') != sre_path:
+            if not _reset_krita():
+                return False
+
+        start_time = time.monotonic()
+        manifest = _load_manifest(name)
+        live_files, live_dirs = _collect_snapshot_items(sre_path, missing_ok=True)
+        stats = config_store.sync(_config_store, manifest, live_files, live_dirs,
+                                  _filtered(manifest, lambda rel: _snapshot_target(rel, sre_path)), progress=progress)
+        print(f"[INFO] 增量应用: {stats}, 复制方式: {_config_store.copier.take_stats()}, "
+              f"{_format_throughput(manifest.total_size(), time.monotonic() - start_time)}")
+    except Exception as e:
+        _report_error(e)
+        return False
+
+    if json_manage.settings_manager.get_setting('krita_resources_path') != sre_path:
+        json_manage.settings_manager.set_setting('krita_resources_path', sre_path)
+    return True
+
+def _use_krita_config_staged(name, sre_path, progress=None):
+    """
+    先在资源目录旁的暂存目录中构建完整配置，再用重命名整体换入
+    换入前现有配置完全不受影响，换入失败时改名回滚
+    """
+    staging_path = f'{sre_path}.staging'
+
+    def staging_target(rel):
+        target = _snapshot_target(rel, sre_path)
+        if target is None:
+            return None
+        if rel.startswith('resources'):
+            return os.path.join(staging_path, os.path.relpath(target, sre_path))
+        return f'{target}.staging'
+
+    try:
+        start_time = time.monotonic()
+        manifest = _load_manifest(name)
+        excluded = []
+        live_files, _ = _collect_snapshot_items(sre_path, missing_ok=True, excluded=excluded)
+        shutil.rmtree(staging_path, ignore_errors=True)
+        stats = config_store.stage(_config_store, manifest, live_files, _filtered(manifest, staging_target),
+                                   progress=progress)
+        # 换入开始后不再响应取消，避免资源目录处于换入一半的状态
+
+        # 资源目录中被筛选规则排除的项（如本地插件、缩略图）先移入暂存目录，与增量应用一样保持不动；
+        # 所在目录不在配置中时与增量应用一样随目录一起移走。换入失败时swap_in会把它们移回原处
+        pairs = []
+        for rel, live_path in excluded:
+            target = staging_target(rel)
+            if target and os.path.isdir(os.path.dirname(target)) and not os.path.lexists(target):
+                pairs.append((live_path, target))
+        pairs.append((staging_path, sre_path))
+
+        # 配置中没有的本地配置文件在换入时一并移走，与重置的行为一致；被筛选规则排除的文件保持不动
+        path_filter = _get_path_filter()
+        for i in _krita_local_appdata_path:
+            rel = f'config/{os.path.basename(i)}'
+            if path_filter.excludes(rel):
+                continue
+            pairs.append((f'{i}.staging' if rel in manifest.files else None, i))
+        old_paths = config_store.swap_in(pairs)
+        print(f"[INFO] 暂存应用: {stats}, 复制方式: {_config_store.copier.take_stats()}, "
+              f"{_format_throughput(manifest.total_size(), time.monotonic() - start_time)}")
+    except Exception as e:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        for i in _krita_local_appdata_path:
+            try:
+                os.remove(f'{i}.staging')
+            except FileNotFoundError:
+                pass
+        _report_error(e)
+        return False
+
+    for i in old_paths:
+        try:
+            config_store.remove_path(i)
+        except OSError as e:
+            print(f"[WARN] 删除旧配置失败: {i}: {e}")
+
+    # 配置的资源目录与当前设置不同时，当前目录在换入成功后再删除
+    current_path = json_manage.settings_manager.get_setting('krita_resources_path')
+    if current_path != sre_path:
+        shutil.rmtree(current_path, ignore_errors=True)
+        json_manage.settings_manager.set_setting('krita_resources_path', sre_path)
+    return True
+
+def _verify_krita_configs(names=None, rate=None, progress=None):
+    complete = names is None
+    if complete:
+        # 旧版本未迁移的配置不在仓库中，不校验也不在这里迁移
+        names = [name for name in json_manage.config_manager.get_all_configs().keys()
+                 if _has_manifest(os.path.join(os.getcwd(), 'config', name))]
+    manifests = {name: _load_manifest(name) for name in names}
+    throttle = config_store.Throttle(rate) if rate else None
+    report = config_store.verify(_config_store, manifests, throttle=throttle, progress=progress, complete=complete)
+
+    configs = report['configs']
+    for name in names:
+        # 配置目录中除清单外不应有其他文件
+        config_dir = os.path.join(os.getcwd(), 'config', name)
+        configs[name]['extra'] = [i for i in os.listdir(config_dir)
+                                  if i not in (config_store.MANIFEST_NAME, config_store.JSON_MANIFEST_NAME)]
+    print(f"[INFO] 校验完成: {report['checked']}个内容, {report['bytes']}字节")
+    if report['extra'] is not None:
+        print(f"[INFO] 仓库中未被引用的内容{len(report['extra'])}个")
+    return configs
+
+def _verify_error_message(name, report):
+    """校验有问题时返回错误提示，没有问题时返回None"""
+    if not report['missing'] and not report['corrupted']:
+        return None
+    return (json_manage.language_manager.get_static().get('error-verify-failed')
+            .replace('{$name}', name)
+            .replace('{$missing}', str(len(report['missing'])))
+            .replace('{$corrupted}', str(len(report['corrupted']))))
+
+def _del_krita_config(name, progress=None):
     path = _get_path(name)[0]
     try:
+        # 删除很快且不能中途停止，只显示阶段
+        _set_stage(progress, 'progress-delete')
+        # 旧版本未迁移的配置不引用仓库中的内容，直接删除目录，不需要先迁移
+        digests = config_store.Manifest.load(_get_manifest_path(name)).digests() if _has_manifest(path) else []
         shutil.rmtree(path)
         json_manage.config_manager.remove_config(name)
+        if digests:
+            # 仅删除磁盘上其他清单（包括登记丢失的配置）都不再引用的内容；其他旧版本配置同样不引用仓库，不迁移
+            try:
+                manifests = [config_store.Manifest.load(i) for i in _find_manifest_paths()]
+            except (OSError, ValueError) as e:
+                # 无法确认哪些内容仍被引用时不删除，留给之后的垃圾回收
+                print(f"[WARN] 读取清单失败，跳过清理仓库: {e}")
+            else:
+                config_store.prune(_config_store, digests, manifests)
+        return True
+    except Exception as e:
+        _report_error(e)
+        return False
+
+_garbage_collector = None
+
+def _holds_config_data(path):
+    """配置目录中是否有清单或旧版本直接复制的内容，这样的目录即使未登记也不能删除"""
+    return any(os.path.exists(os.path.join(path, i))
+               for i in (config_store.MANIFEST_NAME, config_store.JSON_MANIFEST_NAME, 'resources', 'config'))
+
+def _has_manifest(path):
+    """配置目录中是否有清单（二进制或旧版本的JSON格式）"""
+    return any(os.path.exists(os.path.join(path, i)) for i in (config_store.MANIFEST_NAME, config_store.JSON_MANIFEST_NAME))
+
+def _find_manifest_paths():
+    """磁盘上全部配置目录中的清单，不依赖configs.json中的登记，旧版本未迁移的配置没有清单"""
+    config_root = os.path.join(os.getcwd(), 'config')
+    if not os.path.isdir(config_root):
+        return []
+    paths = []
+    for name in os.listdir(config_root):
+        path = os.path.join(config_root, name)
+        if name != '.objects' and os.path.isdir(path) and _has_manifest(path):
+            paths.append(os.path.join(path, config_store.MANIFEST_NAME))
+    return paths
+
+def _find_stale_paths():
+    """
+    查找可以回收的遗留路径：未登记且没有内容的配置目录、导入遗留的临时目录、中断的暂存应用留下的暂存和旧文件
+    只包括一段时间内未被修改的路径，避免删除正在使用的文件
+    """
+    candidates = []
+    registered = json_manage.config_manager.get_all_configs()
+    config_root = os.path.join(os.getcwd(), 'config')
+    if os.path.isdir(config_root):
+        for name in os.listdir(config_root):
+            path = os.path.join(config_root, name)
+            if name == '.objects' or not os.path.isdir(path):
+                continue
+            if name not in registered:
+                # 有清单的目录可能只是登记丢失，保留
+                if not _holds_config_data(path):
+                    candidates.append(path)
+            else:
+                # 中断的清单写入
+                candidates += [os.path.join(path, i) for i in os.listdir(path) if i.endswith('.tmp')]
+
+    temp_root = os.path.join(os.getcwd(), 'temp')
+    if os.path.isdir(temp_root):
+        candidates += [os.path.join(temp_root, i) for i in os.listdir(temp_root)]
+
+    for target in [json_manage.settings_manager.get_setting('krita_resources_path')] + _krita_local_appdata_path:
+        if not target:
+            continue
+        parent, base = os.path.split(os.path.normpath(target))
+        if not os.path.isdir(parent):
+            continue
+        candidates += [os.path.join(parent, i) for i in os.listdir(parent)
+                       if i == f'{base}.staging' or i.startswith(f'{base}.old-')]
+
+    now = time.time()
+    stale = []
+    for path in candidates:
+        try:
+            if now - os.lstat(path).st_mtime > config_store.STALE_AGE:
+                stale.append(path)
+        except FileNotFoundError:
+            pass
+    return stale
+
+def _collect_garbage(budget=None):
+    global _garbage_collector
+    try:
+        if _garbage_collector is None:
+            # 从磁盘上的全部清单标记；旧版本未迁移的配置不引用仓库中的内容，迁移留到使用该配置时
+            manifest_paths = _find_manifest_paths()
+            registered = json_manage.config_manager.get_all_configs()
+            if json_manage.config_manager.load_error or (manifest_paths and not registered):
+                # 登记无法读取时无法判断哪些目录是遗留的，为避免误删不进行回收
+                print("[WARN] 配置登记无法读取或为空，跳过垃圾回收")
+                return True, 0
+            _garbage_collector = config_store.GarbageCollector(_config_store, manifest_paths, _find_stale_paths())
+        done = _garbage_collector.step(budget)
+    except Exception as e:
+        print(f"[WARN] 垃圾回收失败: {e}")
+        done = True
+    reclaimed = _garbage_collector.reclaimed if _garbage_collector else 0
+    if done:
+        if _garbage_collector:
+            print(f"[INFO] 垃圾回收完成: 删除{_garbage_collector.removed}个文件, 回收{reclaimed}字节")
+        _garbage_collector = None
+    return done, reclaimed
+
+def _output_krita_config(name, path, base=None, progress=None):
+    out_path = path.replace('/', '\\')
+    try:
+        _set_stage(progress, 'progress-estimate')
+        estimate = _estimate_output_krita_config(name, out_path)
+        if not _confirm_free_space(estimate):
+            return False
+        _set_stage(progress, 'progress-export', estimate['files'], estimate['bytes'])
+        manifest = _load_manifest(name)
+        start_time = time.monotonic()
+        # 直接从仓库流式写入归档，configs.json在内存中生成
+        extra_files = {'configs.json': json_manage.config_manager.dump_one_config(name).encode('utf-8')}
+        level = json_manage.settings_manager.get_setting('export-compression-level')
+        if base:
+            stats = archive.export_delta(_config_store, manifest, _load_manifest(base), base, out_path, extra_files,
+                                         _filtered(manifest, lambda rel: rel), level=level, progress=progress)
+        else:
+            stats = archive.export_zip(_config_store, manifest, out_path, extra_files,
+                                       _filtered(manifest, lambda rel: rel), level=level, progress=progress)
+        print(f"[INFO] 导出完成: {stats}, {_format_throughput(manifest.total_size(), time.monotonic() - start_time)}")
         return True
     except Exception as e:
-        messagebox.showerror(title=json_manage.language_manager.get_static().get('error'), message=str(e))
+        _report_error(e)
         return False
 
-def _output_krita_config(name, path):
+def _output_krita_bundle(names, path, progress=None):
     out_path = path.replace('/', '\\')
-    path = _get_config_path(name)[0]
-    temp_file_path = os.path.join(os.getcwd(),'temp', name)
-    shutil.copytree(path, temp_file_path)
-    json_manage.config_manager.output_one_config(name, temp_file_path)
-    shutil.make_archive(out_path.replace('.zip', ''), 'zip', temp_file_path)
-    shutil.rmtree(temp_file_path)
-
-def _extract_krita_config(path):
-    temp_file_path = os.path.join(os.getcwd(), 'temp', str(os.path.basename(path).replace('.zip', '')))
-    shutil.unpack_archive(path, temp_file_path)
     try:
-        with open(os.path.join(temp_file_path, 'configs.json'), 'r', encoding='utf-8') as f:
-            configs = json.load(f)
-            return _add_username_path(configs.get('resources_path')), configs.get('platform'), configs.get('name'), temp_file_path
+        _set_stage(progress, 'progress-estimate')
+        manifests = {name: _load_manifest(name) for name in names}
+        unique = {}
+        for manifest in manifests.values():
+            for entry in manifest.files.values():
+                unique[entry['hash']] = entry['size']
+        estimate = {'bytes': sum(unique.values()), 'files': len(unique),
+                    'free': config_store.free_space(os.path.dirname(os.path.abspath(out_path)))}
+        if not _confirm_free_space(estimate):
+            return False
+        _set_stage(progress, 'progress-export', estimate['files'], estimate['bytes'])
+        start_time = time.monotonic()
+        configs = [(dict(json_manage.config_manager.get_config(name), name=name), manifest,
+                    _filtered(manifest, lambda rel: rel)) for name, manifest in manifests.items()]
+        stats = archive.export_bundle(_config_store, configs, out_path,
+                                      level=json_manage.settings_manager.get_setting('export-compression-level'),
+                                      progress=progress)
+        print(f"[INFO] 导出完成: {len(names)}个配置, {stats}, "
+              f"{_format_throughput(estimate['bytes'], time.monotonic() - start_time)}")
+        return True
+    except Exception as e:
+        _report_error(e)
+        return False
+
+def _read_krita_bundle_info(path):
+    try:
+        configs = archive.read_bundle_info(path)
     except Exception as e:
-        messagebox.showerror(title=json_manage.language_manager.get_static().get('error'),message=str(e))
+        _show_error(str(e))
+        return []
+    if configs is None:
+        return None
+    return [(_add_username_path(i['resources_path']), i['platform'], i['name']) for i in configs]
 
-def _input_krita_config(path, new_name=None):
-    json_manage.config_manager.input_one_config(os.path.join(path, 'configs.json'), new_name)
-    shutil.copytree(os.path.join(path, 'resources'), os.path.join(os.getcwd(),'config', new_name, 'resources'))
-    shutil.copytree(os.path.join(path, 'config'), os.path.join(os.getcwd(),'config', new_name, 'config'))
+def _input_krita_bundle(path, names, progress=None):
+    imported = []
+    try:
+        _apply_store_settings()
+        start_time = time.monotonic()
+        _set_stage(progress, 'progress-import')
+        link = json_manage.settings_manager.get_setting('use-hardlinks')
+        configs = archive.import_bundle(_config_store, path, names.keys(), progress=progress, link=link)
+        for name, (info, manifest) in configs.items():
+            new_name = names[name]
+            config_path = _create_config_dir(new_name)
+            try:
+                manifest.save(_get_manifest_path(new_name))
+                json_manage.config_manager.add_one_config(info, new_name)
+            except Exception:
+                shutil.rmtree(config_path, ignore_errors=True)
+                raise
+            imported.append(new_name)
+        print(f"[INFO] 导入完成: {len(imported)}个配置, 用时{time.monotonic() - start_time:.2f}秒")
+    except Exception as e:
+        _report_error(e)
+    return imported
+
+def _check_delta_base(path, name):
+    """
+    增量归档需要本地有内容相同的基础配置
+    :return: 基础配置的清单，不是增量归档时返回None
+    :raise ValueError: 基础配置不存在或内容不同
+    """
+    base = archive.read_delta_info(path)
+    if base is None:
+        return None
+    static = json_manage.language_manager.get_static()
+    if base['name'] not in json_manage.config_manager.get_all_configs():
+        raise ValueError(static.get('error-delta-base-missing').replace('{$name}', name)
+                         .replace('{$base}', base['name']))
+    base_manifest = _load_manifest(base['name'])
+    # 与导出时一样不计入被筛选规则排除的文件
+    if base_manifest.content_digest(_filtered(base_manifest, lambda rel: rel)) != base['hash']:
+        raise ValueError(static.get('error-delta-base-mismatch').replace('{$name}', name)
+                         .replace('{$base}', base['name']))
+    return base_manifest
+
+def _read_krita_config_info(path):
+    try:
+        info = archive.read_config_info(path)
+        # 增量归档在解压任何内容之前先确认基础配置
+        _check_delta_base(path, info['name'])
+        return _add_username_path(info['resources_path']), info['platform'], info['name']
+    except Exception as e:
+        _show_error(str(e))
+        return None
+
+def _input_krita_config(path, new_name=None, progress=None):
+    config_path = None
+    try:
+        info = archive.read_config_info(path)
+        _apply_store_settings()
+        start_time = time.monotonic()
+        base_manifest = _check_delta_base(path, info['name'])
+        _set_stage(progress, 'progress-import')
+        link = json_manage.settings_manager.get_setting('use-hardlinks')
+        if base_manifest is not None:
+            manifest = archive.import_delta(_config_store, path, base_manifest, progress=progress, link=link,
+                                            resolve=_filtered(base_manifest, lambda rel: rel))
+        else:
+            manifest = archive.import_zip(_config_store, path, progress=progress, link=link)
+        config_path = _create_config_dir(new_name)
+        manifest.save(_get_manifest_path(new_name))
+        json_manage.config_manager.add_one_config(info, new_name)
+        print(f"[INFO] 导入完成: {_format_throughput(manifest.total_size(), time.monotonic() - start_time)}")
+        return True
+    except Exception as e:
+        # 只删除这次创建的目录，已存在的同名目录可能是登记丢失的配置
+        if config_path is not None:
+            shutil.rmtree(config_path, ignore_errors=True)
+        _report_error(e)
+        return False
 
 def _get_platform_name():
     return 'windows'
\ No newline at end of file
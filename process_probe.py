@@ -0,0 +1,317 @@
+import csv
+import ctypes
+import io
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+if sys.platform == 'win32':
+    from ctypes import wintypes
+else:
+    wintypes = None
+
+# tlhelp32.h
+_TH32CS_SNAPPROCESS = 0x00000002
+_MAX_PATH = 260
+_INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+# winnt.h / winbase.h / winerror.h
+_SYNCHRONIZE = 0x00100000
+_WAIT_OBJECT_0 = 0x00000000
+_WAIT_TIMEOUT = 0x00000102
+_INFINITE = 0xFFFFFFFF
+_ERROR_INVALID_PARAMETER = 87
+
+# 没有任何等待方式可用时，按此间隔（秒）重新枚举进程判断是否退出
+_EXIT_POLL_INTERVAL = 0.5
+
+
+def _normalize(name):
+    """进程名比较时忽略大小写和.exe后缀，Linux上的/proc/<pid>/comm最长15个字符"""
+    name = name.lower()
+    return name[:-4] if name.endswith('.exe') else name
+
+
+def _psutil_find(name):
+    """通过psutil枚举进程"""
+    target = _normalize(name)
+    pids = []
+    for process in psutil.process_iter(['name']):
+        if process.info['name'] and _normalize(process.info['name']) == target:
+            pids.append(process.pid)
+    return pids
+
+
+def _procfs_find(name):
+    """读取/proc/<pid>/comm，不需要创建进程"""
+    target = _normalize(name)[:15]
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/comm', 'rb') as f:
+                comm = f.read().decode('utf-8', 'replace').strip()
+        except OSError:
+            # 进程在枚举期间退出
+            continue
+        if _normalize(comm)[:15] == target:
+            pids.append(int(entry))
+    return pids
+
+
+if wintypes is not None:
+    class _ProcessEntry32W(ctypes.Structure):
+        _fields_ = [('dwSize', wintypes.DWORD),
+                    ('cntUsage', wintypes.DWORD),
+                    ('th32ProcessID', wintypes.DWORD),
+                    ('th32DefaultHeapID', ctypes.c_size_t),
+                    ('th32ModuleID', wintypes.DWORD),
+                    ('cntThreads', wintypes.DWORD),
+                    ('th32ParentProcessID', wintypes.DWORD),
+                    ('pcPriClassBase', wintypes.LONG),
+                    ('dwFlags', wintypes.DWORD),
+                    ('szExeFile', wintypes.WCHAR * _MAX_PATH)]
+
+    _kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    _kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    _kernel32.CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+    _kernel32.Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessEntry32W)]
+    _kernel32.Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessEntry32W)]
+    _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    _kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    _kernel32.WaitForSingleObject.restype = wintypes.DWORD
+    _kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+
+
+def _toolhelp_find(name):
+    """Windows的Toolhelp32进程快照，在本进程内完成，不需要启动tasklist"""
+    target = _normalize(name)
+    snapshot = _kernel32.CreateToolhelp32Snapshot(_TH32CS_SNAPPROCESS, 0)
+    if snapshot is None or snapshot == _INVALID_HANDLE_VALUE:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        entry = _ProcessEntry32W()
+        entry.dwSize = ctypes.sizeof(_ProcessEntry32W)
+        pids = []
+        ok = _kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while ok:
+            if _normalize(entry.szExeFile) == target:
+                pids.append(entry.th32ProcessID)
+            ok = _kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+        return pids
+    finally:
+        _kernel32.CloseHandle(snapshot)
+
+
+def _tasklist_find(name):
+    """启动tasklist查询，其他方式都不可用时使用"""
+    output = subprocess.check_output(
+        ['tasklist', '/FO', 'CSV', '/NH', '/FI', f'IMAGENAME eq {name}'],
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+    )
+    target = _normalize(name)
+    pids = []
+    # 没有匹配的进程时输出的是一行提示信息而不是CSV
+    for row in csv.reader(io.StringIO(output.decode(errors='replace'))):
+        if len(row) >= 2 and _normalize(row[0]) == target and row[1].isdigit():
+            pids.append(int(row[1]))
+    return pids
+
+
+def _pidfd_wait(pid, timeout):
+    """Linux 5.3+的pidfd，进程退出时变为可读"""
+    try:
+        fd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    try:
+        readable, _, _ = select.select([fd], [], [], timeout)
+        return bool(readable)
+    finally:
+        os.close(fd)
+
+
+def _handle_wait(pid, timeout):
+    """Windows的进程句柄，进程退出时变为有信号状态"""
+    handle = _kernel32.OpenProcess(_SYNCHRONIZE, False, pid)
+    if not handle:
+        error = ctypes.get_last_error()
+        if error == _ERROR_INVALID_PARAMETER:
+            # 进程已经不存在
+            return True
+        raise ctypes.WinError(error)
+    try:
+        milliseconds = _INFINITE if timeout is None else int(timeout * 1000)
+        result = _kernel32.WaitForSingleObject(handle, milliseconds)
+        if result == _WAIT_TIMEOUT:
+            return False
+        if result != _WAIT_OBJECT_0:
+            raise ctypes.WinError(ctypes.get_last_error())
+        return True
+    finally:
+        _kernel32.CloseHandle(handle)
+
+
+def _psutil_wait(pid, timeout):
+    try:
+        psutil.Process(pid).wait(timeout)
+    except psutil.NoSuchProcess:
+        return True
+    except psutil.TimeoutExpired:
+        return False
+    return True
+
+
+def _available_waiters():
+    """按优先级返回当前平台可用的等待进程退出的方式"""
+    waiters = []
+    if wintypes is not None:
+        waiters.append(('wait-handle', _handle_wait))
+    if hasattr(os, 'pidfd_open'):
+        waiters.append(('pidfd', _pidfd_wait))
+    if psutil is not None:
+        waiters.append(('psutil', _psutil_wait))
+    return waiters
+
+
+def _available_probes():
+    """按优先级返回当前平台可用的进程枚举方式"""
+    probes = []
+    if psutil is not None:
+        probes.append(('psutil', _psutil_find))
+    if wintypes is not None:
+        probes.append(('toolhelp32', _toolhelp_find))
+    if os.path.isdir('/proc'):
+        probes.append(('procfs', _procfs_find))
+    if sys.platform == 'win32':
+        probes.append(('tasklist', _tasklist_find))
+    return probes
+
+
+class ProcessMonitor:
+    """
+    查询指定进程是否在运行，缓存最近一次的结果和时间
+    枚举方式在第一次失败时降级到下一种（最后一种除外），并记录每次查询的耗时以便比较
+    """
+
+    def __init__(self, image_name, probes=None):
+        """
+        :param image_name: 进程的映像名，如krita.exe
+        :param probes: [(名称, 查询函数)]，默认按平台自动选择
+        """
+        self.image_name = image_name
+        self._probes = list(probes) if probes is not None else _available_probes()
+        self._index = 0
+        self._waiters = _available_waiters()
+        self._lock = threading.Lock()
+        # 最近一次查询的结果：是否在运行（查询失败为None）、进程ID、完成时间（time.monotonic）
+        self.state = None
+        self.pids = []
+        self.timestamp = None
+        # 查询次数、总耗时、最近一次和最大耗时（秒）
+        self._count = 0
+        self._total_cost = 0.0
+        self._last_cost = 0.0
+        self._max_cost = 0.0
+
+    @property
+    def probe_name(self):
+        """当前使用的枚举方式，全部不可用时为None"""
+        return self._probes[self._index][0] if self._index < len(self._probes) else None
+
+    def probe(self):
+        """
+        立即查询一次并更新缓存
+        :return: True表示正在运行, False表示未运行, None表示所有方式都失败
+        """
+        while self._index < len(self._probes):
+            name, func = self._probes[self._index]
+            start = time.perf_counter()
+            try:
+                pids = func(self.image_name)
+            except Exception as e:
+                if self._index == len(self._probes) - 1:
+                    # 最后一种方式出错可能只是暂时的，下次仍然使用它
+                    print(f"[WARN] 进程查询失败: {name}: {e}")
+                    break
+                print(f"[WARN] 进程查询方式{name}不可用: {e}")
+                with self._lock:
+                    self._index += 1
+                continue
+            cost = time.perf_counter() - start
+            with self._lock:
+                self.pids = pids
+                self.state = bool(pids)
+                self.timestamp = time.monotonic()
+                self._count += 1
+                self._total_cost += cost
+                self._last_cost = cost
+                self._max_cost = max(self._max_cost, cost)
+            return self.state
+
+        with self._lock:
+            self.pids = []
+            self.state = None
+            self.timestamp = time.monotonic()
+        return None
+
+    def wait_exit(self, pid, timeout=None):
+        """
+        阻塞直到指定进程退出，不需要反复枚举进程
+        各等待方式都不可用（如权限不足）时，改为定时重新查询
+        :param pid: 进程ID
+        :param timeout: 最长等待时间（秒），None表示一直等待
+        :return: 进程是否已退出，超时返回False
+        """
+        while self._waiters:
+            name, func = self._waiters[0]
+            try:
+                return func(pid, timeout)
+            except OSError as e:
+                print(f"[WARN] 等待进程退出的方式{name}不可用: {e}")
+                self._waiters.pop(0)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if pid not in self.pids:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(_EXIT_POLL_INTERVAL)
+            self.probe()
+
+    def cached(self, max_age=None):
+        """
+        读取缓存的结果，不创建进程也不枚举
+        :param max_age: 缓存的最长有效时间（秒），超过或从未查询过时重新查询；None表示只在从未查询过时查询
+        :return: 同probe
+        """
+        with self._lock:
+            timestamp, state = self.timestamp, self.state
+        if timestamp is None or (max_age is not None and time.monotonic() - timestamp > max_age):
+            return self.probe()
+        return state
+
+    def stats(self):
+        """
+        查询耗时统计
+        :return: {'probe': 枚举方式, 'count': 次数, 'last': 最近一次耗时, 'mean': 平均耗时, 'max': 最大耗时, 'age': 缓存的时间}
+        """
+        with self._lock:
+            return {
+                'probe': self.probe_name,
+                'count': self._count,
+                'last': self._last_cost,
+                'mean': self._total_cost / self._count if self._count else 0.0,
+                'max': self._max_cost,
+                'age': time.monotonic() - self.timestamp if self.timestamp is not None else None
+            }
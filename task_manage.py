@@ -0,0 +1,336 @@
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """操作被用户取消"""
+
+
+class Busy(Exception):
+    """与正在执行的任务冲突，任务没有开始执行"""
+
+
+class Progress:
+    """
+    长时间操作的进度和取消标记
+    由执行操作的线程（可以是多个工作线程）更新，界面线程定时读取snapshot显示，两者之间只通过这个对象交换数据。
+    取消是协作式的：操作在处理每个文件前后检查标记，已经开始的单个文件会处理完
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._start_time = time.monotonic()
+        self.stage = None
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+
+    def set_stage(self, stage, total_files=0, total_bytes=0):
+        """
+        开始新的阶段，已完成的计数清零
+        :param stage: 阶段名称，见语言文件中的progress-*
+        :param total_files: 该阶段需要处理的文件数
+        :param total_bytes: 该阶段需要处理的字节数
+        """
+        with self._lock:
+            self.stage = stage
+            self.total_files = total_files
+            self.total_bytes = total_bytes
+            self.done_files = 0
+            self.done_bytes = 0
+            self._start_time = time.monotonic()
+        self.check_cancelled()
+
+    def set_total(self, total_files, total_bytes):
+        """操作开始后才能确定总量时（如导入时读取归档目录后）补充当前阶段的总量"""
+        with self._lock:
+            self.total_files = total_files
+            self.total_bytes = total_bytes
+
+    def advance(self, files=1, size=0):
+        """记录完成的文件数和字节数，已被取消时抛出Cancelled"""
+        with self._lock:
+            self.done_files += files
+            self.done_bytes += size
+        self.check_cancelled()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """:raise Cancelled: 已被取消"""
+        if self._cancelled.is_set():
+            raise Cancelled()
+
+    def snapshot(self):
+        """
+        当前进度
+        :return: {'stage', 'done_files', 'total_files', 'done_bytes', 'total_bytes',
+                  'throughput': 字节/秒, 'eta': 预计剩余秒数（无法估计时为None）}
+        """
+        with self._lock:
+            stage = self.stage
+            done_files, total_files = self.done_files, self.total_files
+            done_bytes, total_bytes = self.done_bytes, self.total_bytes
+            elapsed = time.monotonic() - self._start_time
+        throughput = done_bytes / elapsed if elapsed > 0 else 0
+        eta = None
+        if throughput > 0 and total_bytes >= done_bytes:
+            eta = (total_bytes - done_bytes) / throughput
+        elif done_files and total_files >= done_files:
+            # 没有字节数时按文件数估计
+            eta = elapsed / done_files * (total_files - done_files)
+        return {
+            'stage': stage,
+            'done_files': done_files,
+            'total_files': total_files,
+            'done_bytes': done_bytes,
+            'total_bytes': total_bytes,
+            'throughput': throughput,
+            'eta': eta
+        }
+
+
+class UiDispatcher:
+    """
+    把需要在界面线程执行的调用从工作线程转交过去
+    工作线程调用call/post放入队列，界面线程用after()定时调用drain执行
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._ui_thread = threading.current_thread()
+        self._closed = False
+
+    def on_ui_thread(self):
+        return threading.current_thread() is self._ui_thread
+
+    def post(self, func, *args):
+        """在界面线程中执行func，不等待结果"""
+        self._queue.put((func, args, None))
+
+    def call(self, func, *args):
+        """
+        在界面线程中执行func并等待返回值；已在界面线程中时直接执行
+        :raise Cancelled: 界面已关闭
+        :raise: func抛出的异常
+        """
+        if self.on_ui_thread():
+            return func(*args)
+        if self._closed:
+            raise Cancelled()
+        waiter = {'event': threading.Event()}
+        self._queue.put((func, args, waiter))
+        waiter['event'].wait()
+        if 'error' in waiter:
+            raise waiter['error']
+        return waiter['result']
+
+    def drain(self):
+        """执行队列中的全部调用，只能在界面线程中调用"""
+        while True:
+            try:
+                func, args, waiter = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = func(*args)
+                if waiter is not None:
+                    waiter['result'] = result
+            except Exception as e:
+                if waiter is None:
+                    print(f"[WARN] 界面调用失败: {e}")
+                else:
+                    waiter['error'] = e
+            finally:
+                if waiter is not None:
+                    waiter['event'].set()
+
+    def close(self):
+        """界面关闭后调用，之后及正在等待的call抛出Cancelled，避免工作线程一直等待"""
+        self._closed = True
+        while True:
+            try:
+                _, _, waiter = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if waiter is not None:
+                waiter['error'] = Cancelled()
+                waiter['event'].set()
+
+
+class JobExecutor:
+    """
+    在工作线程中执行长时间操作，完成后经由UiDispatcher在界面线程中回调
+    每个任务声明独占和共享的冲突键（如配置名称、配置仓库），与正在执行的任务冲突的任务不会开始，由调用方提示用户
+    """
+
+    def __init__(self, dispatcher, workers=2):
+        self._dispatcher = dispatcher
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._exclusive = set()
+        self._shared = collections.Counter()
+        self._progresses = set()
+
+    def try_acquire(self, exclusive=(), shared=()):
+        """
+        占用冲突键，与已占用的键冲突时不占用任何键
+        独占键与任何占用冲突，共享键只与独占占用冲突
+        :return: 是否成功占用
+        """
+        with self._lock:
+            if any(key in self._exclusive or self._shared[key] for key in exclusive):
+                return False
+            if any(key in self._exclusive for key in shared):
+                return False
+            self._exclusive.update(exclusive)
+            self._shared.update(shared)
+            return True
+
+    def release(self, exclusive=(), shared=()):
+        with self._lock:
+            self._exclusive.difference_update(exclusive)
+            self._shared.subtract(shared)
+            self._shared = +self._shared
+
+    def submit(self, func, *args, exclusive=(), shared=(), progress=None, on_done=None):
+        """
+        提交任务，任务结束并释放冲突键后在界面线程中调用on_done(func的返回值)
+        func抛出未处理的异常时只记录日志，on_done收到None
+        :param exclusive: 独占的冲突键
+        :param shared: 共享的冲突键
+        :param progress: 进度，提供时以progress关键字参数传给func，关闭时会被取消
+        :param on_done: 完成回调（可选）
+        :raise Busy: 与正在执行的任务冲突
+        """
+        exclusive = set(exclusive)
+        shared = set(shared) - exclusive
+        if not self.try_acquire(exclusive, shared):
+            raise Busy()
+        if progress is not None:
+            with self._lock:
+                self._progresses.add(progress)
+
+        def run():
+            result = None
+            try:
+                if progress is None:
+                    result = func(*args)
+                else:
+                    result = func(*args, progress=progress)
+            except Cancelled:
+                print("[INFO] 后台任务已取消")
+            except Exception as e:
+                print(f"[WARN] 后台任务失败: {e!r}")
+            finally:
+                self.release(exclusive, shared)
+                with self._lock:
+                    self._progresses.discard(progress)
+            if on_done is not None:
+                self._dispatcher.post(on_done, result)
+            return result
+
+        return self._pool.submit(run)
+
+    def shutdown(self):
+        """取消全部正在执行的任务并丢弃排队的任务，不等待工作线程结束"""
+        with self._lock:
+            for progress in self._progresses:
+                progress.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# 尚未发布过任何状态
+_NO_STATE = object()
+
+
+class StatusBus:
+    """
+    线程安全的状态广播：任意线程发布状态，订阅者在界面线程中收到(状态, 时间戳)
+    与当前状态相同的发布会被忽略；界面线程处理之前连续发布的多个状态合并为最后一个，合并后与已送达的状态相同时不再送达
+    """
+
+    def __init__(self, dispatcher=None):
+        """:param dispatcher: UiDispatcher，为None时在发布的线程中直接回调"""
+        self.dispatcher = dispatcher
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._state = _NO_STATE
+        self._timestamp = None
+        self._delivered = _NO_STATE
+        self._pending = False
+
+    @property
+    def state(self):
+        """当前状态，尚未发布过时为None"""
+        with self._lock:
+            return None if self._state is _NO_STATE else self._state
+
+    @property
+    def timestamp(self):
+        """当前状态开始的时间（time.time），尚未发布过时为None"""
+        with self._lock:
+            return self._timestamp
+
+    def subscribe(self, callback):
+        """
+        订阅状态变化，已有状态时会先收到一次当前状态
+        :param callback: 回调函数，参数为(状态, 时间戳)
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+            state, timestamp = self._delivered, self._timestamp
+        if state is not _NO_STATE:
+            self._post(callback, state, timestamp)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, state):
+        """
+        发布状态
+        :return: 状态是否发生了变化
+        """
+        with self._lock:
+            if state == self._state:
+                return False
+            self._state = state
+            self._timestamp = time.time()
+            # 已经有一次送达在排队时，它会读取最新的状态
+            if self._pending:
+                return True
+            self._pending = True
+        self._post(self._deliver)
+        return True
+
+    def _post(self, func, *args):
+        if self.dispatcher is None:
+            func(*args)
+        else:
+            self.dispatcher.post(func, *args)
+
+    def _deliver(self):
+        with self._lock:
+            self._pending = False
+            if self._state == self._delivered:
+                return
+            self._delivered = state = self._state
+            timestamp = self._timestamp
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(state, timestamp)
+            except Exception as e:
+                print(f"[WARN] 状态回调失败: {e}")